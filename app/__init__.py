@@ -1,12 +1,19 @@
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 import os
 import logging
+from .ratelimit import RateLimiter
+from .replicas import ReplicaRouter, RoutingSession
+from .sharding import ShardRouter
+from .logconfig import configure_logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+limiter = RateLimiter()
+replica_router = ReplicaRouter()
+shard_router = ShardRouter()
 
 def create_app():
     app = Flask(__name__)
@@ -17,16 +24,148 @@ def create_app():
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    app.config['SUBSCRIPTION_RETENTION_DAYS'] = int(os.environ.get('SUBSCRIPTION_RETENTION_DAYS', 30))
+    app.config['SUBSCRIPTION_PURGE_BATCH_SIZE'] = int(os.environ.get('SUBSCRIPTION_PURGE_BATCH_SIZE', 500))
+    # 0 отключает фоновую очистку (можно запускать через `flask purge-subscriptions`)
+    app.config['SUBSCRIPTION_PURGE_INTERVAL'] = int(os.environ.get('SUBSCRIPTION_PURGE_INTERVAL', 0))
     
+    # Лимиты запросов: токенов в секунду и размер корзины на пользователя/IP
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+    app.config['RATELIMIT_STORAGE_PATH'] = os.environ.get('RATELIMIT_STORAGE_PATH', '/dev/shm/rgz_ratelimit')
+    app.config['RATELIMIT_TRUST_X_REAL_IP'] = os.environ.get('RATELIMIT_TRUST_X_REAL_IP', '1') == '1'
+    app.config['RATELIMIT_READ_RATE'] = float(os.environ.get('RATELIMIT_READ_RATE', 20))
+    app.config['RATELIMIT_READ_BURST'] = float(os.environ.get('RATELIMIT_READ_BURST', 100))
+    app.config['RATELIMIT_WRITE_RATE'] = float(os.environ.get('RATELIMIT_WRITE_RATE', 2))
+    app.config['RATELIMIT_WRITE_BURST'] = float(os.environ.get('RATELIMIT_WRITE_BURST', 20))
+    # Общий бюджет узла, 0 отключает глобальный лимит
+    app.config['RATELIMIT_GLOBAL_READ_RATE'] = float(os.environ.get('RATELIMIT_GLOBAL_READ_RATE', 0))
+    app.config['RATELIMIT_GLOBAL_READ_BURST'] = float(os.environ.get('RATELIMIT_GLOBAL_READ_BURST', 0))
+    app.config['RATELIMIT_GLOBAL_WRITE_RATE'] = float(os.environ.get('RATELIMIT_GLOBAL_WRITE_RATE', 200))
+    app.config['RATELIMIT_GLOBAL_WRITE_BURST'] = float(os.environ.get('RATELIMIT_GLOBAL_WRITE_BURST', 400))
+    
+    # Read-реплики через запятую; GET-запросы уходят на них, записи - на primary
+    app.config['DATABASE_REPLICA_URLS'] = [
+        url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    app.config['REPLICA_MAX_LAG_BYTES'] = int(os.environ.get('REPLICA_MAX_LAG_BYTES', 16 * 1024 * 1024))
+    app.config['REPLICA_CHECK_INTERVAL'] = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+    # Сколько секунд после записи чтения пользователя идут на primary
+    app.config['READ_YOUR_WRITES_WINDOW'] = float(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+    app.config['REPLICA_PIN_STORAGE_PATH'] = os.environ.get('REPLICA_PIN_STORAGE_PATH', '/dev/shm/rgz_replica_pins')
+    
+    # delta: аудит хранит только изменившиеся поля, full: полные снимки
+    app.config['AUDIT_ENCODING'] = os.environ.get('AUDIT_ENCODING', 'delta')
+    
+    # Шарды по user_id через запятую; DATABASE_URL хранит shard_directory
+    app.config['SHARD_DATABASE_URLS'] = [
+        url.strip() for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url.strip()
+    ]
+    app.config['SHARD_DIRECTORY_CACHE_TTL'] = float(os.environ.get('SHARD_DIRECTORY_CACHE_TTL', 5))
+    app.config['SHARD_DIRECTORY_CACHE_SIZE'] = int(os.environ.get('SHARD_DIRECTORY_CACHE_SIZE', 100000))
+    
+    # Логи пишутся фоновым потоком; json или text
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+    app.config['LOG_QUEUE_SIZE'] = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Доля сохраняемых записей ниже WARNING: 'app.routes=0.1,app.replicas=0.5'
+    app.config['LOG_SAMPLING'] = os.environ.get('LOG_SAMPLING', '')
+    app.config['LOG_RATE_LIMIT_BURST'] = int(os.environ.get('LOG_RATE_LIMIT_BURST', 10))
+    app.config['LOG_RATE_LIMIT_PERIOD'] = float(os.environ.get('LOG_RATE_LIMIT_PERIOD', 60))
+    
+    configure_logging(app)
+    replica_router.configure(app)
+    shard_router.configure(app)
     db.init_app(app)
+    limiter.init_app(app)
+    replica_router.init_app(app, db)
+    shard_router.init_app(app, db)
     
-    with app.app_context():
-        # Используем правильный импорт - Migrator из migration.migrator
-        from .migration.migrator import Migrator
+    # Используем правильный импорт - Migrator из migration.migrator
+    from .migration.migrator import Migrator
+    # Миграции применяются к основной базе и к каждому шарду
+    for shard in shard_router.each_shard(app):
         migrator = Migrator(db)
         migrator.run_migrations()
+        if shard is not None:
+            shard_router.configure_sequences(shard)
+    with app.app_context():
+        shard_router.load_buckets()
     
     from . import routes
     app.register_blueprint(routes.bp)
     
+    from .purge import SubscriptionPurger
+    purger = SubscriptionPurger(
+        db,
+        retention_days=app.config['SUBSCRIPTION_RETENTION_DAYS'],
+        batch_size=app.config['SUBSCRIPTION_PURGE_BATCH_SIZE']
+    )
+    
+    @app.cli.command('purge-subscriptions')
+    def purge_subscriptions():
+        """Физическое удаление старых неактивных подписок"""
+        for _ in shard_router.each_shard(app):
+            purger.run()
+    
+    from .export import EXPORT_TABLES, build_copy_query, export_to_file
+    
+    @app.cli.command('export-table')
+    @click.argument('table', type=click.Choice(list(EXPORT_TABLES)))
+    @click.option('--output', required=True, help='Файл выгрузки, .gz - со сжатием')
+    @click.option('--user-id', type=int)
+    @click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']))
+    @click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']))
+    def export_table(table, output, user_id, date_from, date_to):
+        """Потоковая выгрузка таблицы в CSV через COPY"""
+        if not shard_router.enabled:
+            engines = [replica_router.read_engine()]
+        elif user_id is not None:
+            engines = [db.engines[shard_router.shard_for_user(user_id)]]
+        else:
+            engines = [db.engines[key] for key in shard_router.shards]
+        
+        for index, engine in enumerate(engines):
+            query = build_copy_query(
+                table,
+                user_id=user_id,
+                date_from=date_from.date() if date_from else None,
+                date_to=date_to.date() if date_to else None,
+                header=index == 0
+            )
+            export_to_file(engine, query, output, append=index > 0)
+    
+    from .audit import AuditCompactor
+    
+    @app.cli.command('compact-audit')
+    @click.option('--batch-size', type=int, default=1000)
+    def compact_audit(batch_size):
+        """Перевод старых записей аудита в delta-кодирование пачками"""
+        for shard in shard_router.each_shard(app):
+            stats = AuditCompactor(db, batch_size=batch_size).run()
+            click.echo(
+                f"{shard or 'default'}: UPDATE: {stats['updates_converted']}, "
+                f"DELETE: {stats['deletes_converted']}, "
+                f"JSONB: {stats['size_before']} -> {stats['size_after']} байт"
+            )
+    
+    from .sharding import ShardRebalancer
+    
+    @app.cli.command('move-user')
+    @click.argument('user_id', type=int)
+    @click.argument('target_shard', type=int)
+    def move_user(user_id, target_shard):
+        """Онлайн-перенос строк пользователя на другой шард"""
+        if not shard_router.enabled:
+            raise click.UsageError('Шардинг не настроен (SHARD_DATABASE_URLS)')
+        moved = ShardRebalancer(db, shard_router).move_user(user_id, target_shard)
+        click.echo(f"Перенесено строк: {moved}")
+    
+    if app.config['SUBSCRIPTION_PURGE_INTERVAL'] > 0:
+        purger.start_background(
+            app,
+            app.config['SUBSCRIPTION_PURGE_INTERVAL'],
+            contexts=lambda: shard_router.each_shard(app)
+        )
+    
     return app
\ No newline at end of file
@@ -0,0 +1,181 @@
+import logging
+from sqlalchemy import text
+
+FULL = 'full'
+DELTA = 'delta'
+
+# Для DELETE в delta-режиме достаточно зафиксировать деактивацию, если
+# остальные поля восстанавливаются из предыдущих записей аудита
+DELETE_DELTA = ({'is_active': True}, {'is_active': False})
+
+
+def diff_values(old_values, new_values):
+    """Только изменившиеся поля: (старые значения, новые значения)"""
+    old_values = old_values or {}
+    new_values = new_values or {}
+    changed = [
+        key for key in old_values.keys() | new_values.keys()
+        if old_values.get(key) != new_values.get(key)
+    ]
+    return (
+        {key: old_values[key] for key in changed if key in old_values},
+        {key: new_values[key] for key in changed if key in new_values}
+    )
+
+
+def covers(state, snapshot):
+    """Снимок полностью восстанавливается из состояния по истории аудита"""
+    return all(key in state and state[key] == value for key, value in (snapshot or {}).items())
+
+
+def encode_values(action, old_values, new_values, encoding, state=None):
+    """Значения для записи аудита в выбранном кодировании: (old, new, encoding).
+
+    state - последнее восстановленное состояние строки. Поля, которых не
+    будет в delta (неизменившиеся в UPDATE и все поля в DELETE), должны
+    восстанавливаться из него, иначе запись остается полным снимком.
+    """
+    # CREATE всегда хранит полное начальное состояние - от него строится история
+    if encoding != DELTA or action == 'CREATE':
+        return old_values, new_values, FULL
+    if action == 'DELETE':
+        if not covers(state or {}, old_values):
+            return old_values, new_values, FULL
+        old_values, new_values = (dict(values) for values in DELETE_DELTA)
+        return old_values, new_values, DELTA
+    unchanged = {
+        key: value for key, value in (old_values or {}).items()
+        if key in (new_values or {}) and new_values[key] == value
+    }
+    if not covers(state or {}, unchanged):
+        return old_values, new_values, FULL
+    old_values, new_values = diff_values(old_values, new_values)
+    return old_values, new_values, DELTA
+
+
+def rebuild_states(entries):
+    """Восстановление полных состояний до/после для записей аудита одной строки.
+
+    Записи должны идти по возрастанию id. Правило одинаково для обоих
+    кодирований: before = состояние + old_values, after = before + new_values.
+    """
+    state = {}
+    history = []
+    for entry in entries:
+        before = {**state, **(entry.old_values or {})}
+        after = {**before, **(entry.new_values or {})}
+        history.append({
+            'id': entry.id,
+            'action': entry.action,
+            'encoding': entry.encoding,
+            'created_at': entry.created_at.isoformat() if entry.created_at else None,
+            'before': before if entry.action != 'CREATE' else None,
+            'after': after
+        })
+        state = after
+    return history
+
+
+def record_entries(table_name, record_id):
+    from .models import AuditLog
+    return AuditLog.query.filter_by(
+        table_name=table_name,
+        record_id=record_id
+    ).order_by(AuditLog.id).all()
+
+
+def get_record_history(table_name, record_id):
+    """История изменений строки с полными состояниями"""
+    return rebuild_states(record_entries(table_name, record_id))
+
+
+def get_record_state(table_name, record_id):
+    """Последнее состояние строки по истории аудита ({} без записей)"""
+    history = get_record_history(table_name, record_id)
+    return history[-1]['after'] if history else {}
+
+
+class AuditCompactor:
+    """Пакетный перевод старых записей аудита из full в delta"""
+
+    def __init__(self, db, batch_size=1000):
+        self.db = db
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def payload_size(self):
+        """Объем JSONB-данных аудита в байтах (место таблицы освобождает VACUUM)"""
+        return self.db.session.execute(text('''
+            SELECT COALESCE(SUM(
+                COALESCE(pg_column_size(old_values), 0) + COALESCE(pg_column_size(new_values), 0)
+            ), 0)
+            FROM audit_logs
+        ''')).scalar()
+
+    def compact_batch(self, after_id=0):
+        """Одна пачка full-записей UPDATE и DELETE.
+
+        Возвращает (UPDATE в delta, DELETE в delta, последний id). Запись
+        переводится в delta только тем же правилом encode_values, что и при
+        записи: поля вне delta должны восстанавливаться из предыдущих
+        записей аудита строки, иначе снимок остается полным.
+        """
+        from .models import AuditLog
+        batch = AuditLog.query.filter(
+            AuditLog.encoding == FULL,
+            AuditLog.action.in_(('UPDATE', 'DELETE')),
+            AuditLog.id > after_id
+        ).order_by(AuditLog.id).limit(self.batch_size).all()
+        if not batch:
+            return 0, 0, after_id
+
+        records = {(entry.table_name, entry.record_id) for entry in batch}
+        previous = AuditLog.query.filter(
+            AuditLog.table_name.in_({table for table, _ in records}),
+            AuditLog.record_id.in_({record for _, record in records}),
+            AuditLog.id < batch[-1].id
+        ).order_by(AuditLog.id).all()
+
+        by_record = {}
+        for item in previous:
+            by_record.setdefault((item.table_name, item.record_id), []).append(item)
+
+        converted = {'UPDATE': 0, 'DELETE': 0}
+        for entry in batch:
+            prior = [
+                item for item in by_record.get((entry.table_name, entry.record_id), [])
+                if item.id < entry.id
+            ]
+            state = rebuild_states(prior)[-1]['after'] if prior else {}
+            old_values, new_values, encoding = encode_values(
+                entry.action, entry.old_values, entry.new_values, DELTA, state
+            )
+            if encoding == DELTA:
+                entry.old_values, entry.new_values, entry.encoding = old_values, new_values, DELTA
+                converted[entry.action] += 1
+
+        self.db.session.commit()
+        return converted['UPDATE'], converted['DELETE'], batch[-1].id
+
+    def run(self):
+        """Конвертация всех full-записей, возвращает статистику"""
+        size_before = self.payload_size()
+        updates = 0
+        deletes = 0
+        last_id = 0
+        while True:
+            converted_updates, converted_deletes, next_id = self.compact_batch(last_id)
+            if next_id == last_id:
+                break
+            updates += converted_updates
+            deletes += converted_deletes
+            last_id = next_id
+
+        stats = {
+            'updates_converted': updates,
+            'deletes_converted': deletes,
+            'size_before': size_before,
+            'size_after': self.payload_size()
+        }
+        self.logger.info("Сжатие аудита завершено: %s", stats)
+        return stats
@@ -0,0 +1,176 @@
+import gzip
+import logging
+import queue
+import threading
+import zlib
+from datetime import datetime, time as dt_time
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, доступные для выгрузки: колонки и колонка для фильтра по дате
+EXPORT_TABLES = {
+    'subscriptions': (
+        ('id', 'user_id', 'name', 'amount', 'periodicity', 'start_date', 'next_billing_date',
+         'description', 'is_active', 'created_at', 'updated_at', 'deleted_at'),
+        'created_at'
+    ),
+    'audit_logs': (
+        ('id', 'user_id', 'action', 'table_name', 'record_id', 'old_values', 'new_values',
+         'encoding', 'created_at'),
+        'created_at'
+    ),
+}
+
+CHUNK_QUEUE_SIZE = 64
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def parse_date(value):
+    """Разбор даты фильтра в формате YYYY-MM-DD (ValueError при ошибке)"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def build_copy_query(table, user_id=None, date_from=None, date_to=None, header=True):
+    """Сборка COPY (SELECT ...) TO STDOUT с безопасной подстановкой фильтров"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table: {table}")
+
+    columns, date_column = EXPORT_TABLES[table]
+    conditions = []
+    if user_id is not None:
+        conditions.append(sql.SQL('user_id = {}').format(sql.Literal(int(user_id))))
+    if date_from is not None:
+        conditions.append(sql.SQL('{} >= {}').format(
+            sql.Identifier(date_column), sql.Literal(datetime.combine(date_from, dt_time.min))
+        ))
+    if date_to is not None:
+        conditions.append(sql.SQL('{} <= {}').format(
+            sql.Identifier(date_column), sql.Literal(datetime.combine(date_to, dt_time.max))
+        ))
+
+    where = sql.SQL('')
+    if conditions:
+        where = sql.SQL(' WHERE ') + sql.SQL(' AND ').join(conditions)
+
+    return sql.SQL('COPY (SELECT {columns} FROM {table}{where} ORDER BY id) '
+                   'TO STDOUT WITH (FORMAT csv, HEADER {header})').format(
+        columns=sql.SQL(', ').join(sql.Identifier(column) for column in columns),
+        table=sql.Identifier(table),
+        where=where,
+        header=sql.SQL('true' if header else 'false')
+    )
+
+
+class _QueueWriter:
+    """Файлоподобный объект для copy_expert, передающий чанки в очередь"""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+
+    def put(self, item):
+        # Ждем места в очереди, пока потребитель не отменил выгрузку
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        self.put(data)
+        return len(data)
+
+
+def stream_export(engine, query, compress=False):
+    """Генератор байтов выгрузки с постоянным потреблением памяти.
+
+    COPY выполняется в отдельном потоке и пишет в ограниченную очередь,
+    поэтому база отдает данные не быстрее, чем их читает клиент.
+    """
+    connection = engine.raw_connection()
+    chunks = queue.Queue(maxsize=CHUNK_QUEUE_SIZE)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+    writer = _QueueWriter(chunks, cancelled)
+
+    def copy():
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(query, writer)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                writer.put(done)
+            except ExportCancelled:
+                pass
+
+    thread = threading.Thread(target=copy, name='copy-export', daemon=True)
+    thread.start()
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    finished = False
+
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+        if errors:
+            logger.error("Export failed: %s", errors[0])
+            raise errors[0]
+        finished = True
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        # Клиент мог отключиться: останавливаем COPY, а прерванное
+        # соединение не возвращаем в пул
+        cancelled.set()
+        thread.join()
+        if finished and not errors:
+            connection.rollback()
+        else:
+            connection.invalidate()
+        connection.close()
+
+
+def stream_sharded_export(engines, table, compress=False, **filters):
+    """Последовательная выгрузка с нескольких шардов одним потоком.
+
+    Заголовок CSV пишется только для первого шарда; при сжатии каждый шард
+    дает отдельный gzip-member, а их конкатенация - корректный gzip-файл.
+    """
+    for index, engine in enumerate(engines):
+        query = build_copy_query(table, header=index == 0, **filters)
+        yield from stream_export(engine, query, compress)
+
+
+def export_to_file(engine, query, path, append=False):
+    """Выгрузка COPY напрямую в файл (.gz - со сжатием)"""
+    connection = engine.raw_connection()
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'ab' if append else 'wb') as output, connection.cursor() as cursor:
+            cursor.copy_expert(query, output)
+        connection.rollback()
+    finally:
+        connection.close()
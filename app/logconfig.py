@@ -0,0 +1,208 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет в запись id текущего HTTP-запроса"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Выборочная запись сообщений ниже WARNING для указанных логгеров.
+
+    rates: {'app.routes': 0.1} - доля сохраняемых записей; правило
+    применяется к логгеру и всем его потомкам.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.cache = {}
+
+    def rate_for(self, name):
+        rate = self.cache.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split('.')
+            for length in range(len(parts), 0, -1):
+                prefix = '.'.join(parts[:length])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self.cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше burst одинаковых сообщений за period секунд.
+
+    Одинаковыми считаются записи с тем же логгером, уровнем и текстом
+    сообщения после подстановки аргументов, поэтому разные ошибки с общим
+    шаблоном не подавляют друг друга. Число подавленных записей попадает
+    в следующую пропущенную.
+    """
+
+    def __init__(self, burst=10, period=60.0, max_keys=10000):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.max_keys = max_keys
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def prune(self, now):
+        """Удаление истекших окон, чтобы уникальные сообщения не копились"""
+        expired = [key for key, (started, _, _) in self.windows.items() if now - started >= self.period]
+        for key in expired:
+            del self.windows[key]
+        if len(self.windows) >= self.max_keys:
+            self.windows.clear()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self.lock:
+            if key not in self.windows and len(self.windows) >= self.max_keys:
+                self.prune(now)
+            started, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - started >= self.period:
+                started, count = now, 0
+            if count >= self.burst:
+                self.windows[key] = (started, count, suppressed + 1)
+                return False
+            self.windows[key] = (started, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        dropped = getattr(record, 'dropped', None)
+        if dropped:
+            entry['dropped'] = dropped
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись и не ждет места в очереди.
+
+    Форматирование и запись в поток выполняет QueueListener в фоновом
+    потоке; при переполнении очереди запись отбрасывается и учитывается,
+    а число отброшенных с прошлого раза попадает в следующую запись.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.reported = 0
+
+    def prepare(self, record):
+        # Аргументы подставляются сразу, пока объекты не изменились;
+        # traceback форматируется уже в фоновом потоке. Запись не копируется:
+        # у корневого логгера это единственный обработчик
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        dropped = self.dropped
+        if dropped > self.reported:
+            record.dropped = dropped - self.reported
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.reported = dropped
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'capacity': self.queue.maxsize, 'dropped': self.dropped}
+
+
+def parse_sampling(value):
+    """'app.routes=0.1,app.replicas=0.5' -> {'app.routes': 0.1, ...}"""
+    rates = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(app):
+    """Перевод корневого логгера на очередь с фоновой записью в stdout"""
+    output = logging.StreamHandler(sys.stdout)
+    if app.config['LOG_FORMAT'] == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+        ))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE']))
+    handler.addFilter(SamplingFilter(parse_sampling(app.config['LOG_SAMPLING'])))
+    handler.addFilter(RateLimitFilter(
+        burst=app.config['LOG_RATE_LIMIT_BURST'],
+        period=app.config['LOG_RATE_LIMIT_PERIOD']
+    ))
+    handler.addFilter(RequestIdFilter())
+
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+
+    @app.before_request
+    def assign_request_id():
+        # nginx передает свой $request_id, иначе генерируем id сами
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @app.after_request
+    def return_request_id(response):
+        if g.get('request_id'):
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    app.extensions['log_handler'] = handler
+    return handler
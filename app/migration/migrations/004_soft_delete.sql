@@ -0,0 +1,24 @@
+-- Мягкое удаление подписок: помечаем строку вместо физического удаления
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- Частичные индексы: горячие чтения затрагивают только активные строки
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active ON subscriptions(user_id) WHERE is_active;
+
+-- Индекс для фоновой очистки неактивных строк
+CREATE INDEX IF NOT EXISTS idx_subscriptions_deleted_at ON subscriptions(deleted_at) WHERE NOT is_active;
+
+-- Архив физически удаленных подписок
+CREATE TABLE IF NOT EXISTS subscriptions_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL,
+    periodicity VARCHAR(20) NOT NULL,
+    start_date DATE NOT NULL,
+    next_billing_date DATE NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    deleted_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,21 @@
+-- Таблица аудита (создается, если ее еще нет)
+CREATE TABLE IF NOT EXISTS audit_logs (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    action VARCHAR(50) NOT NULL,
+    table_name VARCHAR(50) NOT NULL,
+    record_id INTEGER NOT NULL,
+    old_values JSONB,
+    new_values JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- JSONB хранится в разобранном бинарном виде и поддерживает операторы для diff
+ALTER TABLE audit_logs ALTER COLUMN old_values TYPE JSONB USING old_values::jsonb;
+ALTER TABLE audit_logs ALTER COLUMN new_values TYPE JSONB USING new_values::jsonb;
+
+-- full: полные снимки, delta: только измененные поля
+ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS encoding VARCHAR(10) NOT NULL DEFAULT 'full';
+
+-- Восстановление истории записи читает ее записи аудита по порядку
+CREATE INDEX IF NOT EXISTS idx_audit_logs_record ON audit_logs(table_name, record_id, id);
@@ -0,0 +1,6 @@
+-- Исключения из хэш-распределения пользователей по шардам (используется в основной базе)
+CREATE TABLE IF NOT EXISTS shard_directory (
+    user_id INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
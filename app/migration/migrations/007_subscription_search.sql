@@ -0,0 +1,15 @@
+-- Триграммный поиск по названию и описанию подписок
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- btree_gin позволяет держать user_id и триграммы в одном GIN-индексе
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_name_trgm
+    ON subscriptions USING gin (user_id, name gin_trgm_ops) WHERE is_active;
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_description_trgm
+    ON subscriptions USING gin (user_id, description gin_trgm_ops) WHERE is_active;
+
+-- Префиксный поиск с пагинацией идет по индексу в порядке (name, id)
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_name
+    ON subscriptions (user_id, name, id) WHERE is_active;
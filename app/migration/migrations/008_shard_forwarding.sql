@@ -0,0 +1,7 @@
+-- Метки переноса на исходном шарде: куда ушел пользователь. По ним
+-- воркеры с устаревшим кэшем shard_directory находят новый шард
+CREATE TABLE IF NOT EXISTS shard_forwarding (
+    user_id INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    moved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
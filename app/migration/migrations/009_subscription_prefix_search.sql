@@ -0,0 +1,11 @@
+-- Префиксный поиск без учета регистра: lower(name) в C-сортировке
+-- поддерживает и LIKE 'abc%', и ORDER BY по индексу
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_lower_name
+    ON subscriptions (user_id, (lower(name) COLLATE "C"), id) WHERE is_active;
+
+-- Поиск без user_id (когда шардинг выключен)
+CREATE INDEX IF NOT EXISTS idx_subscriptions_lower_name
+    ON subscriptions ((lower(name) COLLATE "C"), id) WHERE is_active;
+
+-- ILIKE по префиксу не использовал этот индекс
+DROP INDEX IF EXISTS idx_subscriptions_user_name;
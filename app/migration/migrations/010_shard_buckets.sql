@@ -0,0 +1,6 @@
+-- Карта виртуальных корзин user_id на шарды (используется в основной базе).
+-- Заполняется при первом запуске с шардами и дальше меняется только вручную
+CREATE TABLE IF NOT EXISTS shard_buckets (
+    bucket INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL
+);
@@ -24,7 +24,7 @@ class Migrator:
             self.logger.info("Таблица migrations_log создана успешно")
             return True
         except Exception as e:
-            self.logger.error(f"Ошибка при создании таблицы: {e}")
+            self.logger.error("Ошибка при создании таблицы: %s", e)
             return False
 
     def load_changelog(self):
@@ -33,7 +33,7 @@ class Migrator:
             with open('changelog.yaml', 'r') as file:
                 return yaml.safe_load(file)
         except Exception as e:
-            self.logger.error(f"Ошибка загрузки changelog: {e}")
+            self.logger.error("Ошибка загрузки changelog: %s", e)
             return []
 
     def calculate_checksum(self, file_path):
@@ -43,7 +43,7 @@ class Migrator:
                 content = file.read()
                 return hashlib.sha256(content.encode()).hexdigest()
         except Exception as e:
-            self.logger.error(f"Ошибка вычисления checksum для {file_path}: {e}")
+            self.logger.error("Ошибка вычисления checksum для %s: %s", file_path, e)
             return None
 
     def get_executed_migrations(self):
@@ -54,7 +54,7 @@ class Migrator:
             )
             return {row[0]: {'file_path': row[1], 'checksum': row[2]} for row in result}
         except Exception as e:
-            self.logger.error(f"Ошибка получения выполненных миграций: {e}")
+            self.logger.error("Ошибка получения выполненных миграций: %s", e)
             return {}
 
     def execute_migration(self, file_path):
@@ -71,12 +71,12 @@ class Migrator:
                     self.db.session.execute(text(statement))
             
             self.db.session.commit()
-            self.logger.info(f"Миграция выполнена: {file_path}")
+            self.logger.info("Миграция выполнена: %s", file_path)
             return True
             
         except Exception as e:
             self.db.session.rollback()
-            self.logger.error(f"Ошибка выполнения миграции {file_path}: {e}")
+            self.logger.error("Ошибка выполнения миграции %s: %s", file_path, e)
             return False
 
     def run_migrations(self):
@@ -102,7 +102,7 @@ class Migrator:
 
             # Проверяем существование файла миграции
             if not os.path.exists(file_path):
-                self.logger.error(f"Файл миграции не найден: {file_path}")
+                self.logger.error("Файл миграции не найден: %s", file_path)
                 return False
 
             current_checksum = self.calculate_checksum(file_path)
@@ -114,16 +114,17 @@ class Migrator:
                 # Проверяем контрольную сумму
                 if executed_mig['checksum'] != current_checksum:
                     self.logger.error(
-                        f"Миграция {mig_id} была изменена после выполнения. "
-                        f"База данных в несогласованном состоянии."
+                        "Миграция %s была изменена после выполнения. "
+                        "База данных в несогласованном состоянии.",
+                        mig_id
                     )
                     return False
                 
-                self.logger.info(f"Миграция {mig_id} уже выполнена, пропускаем")
+                self.logger.info("Миграция %s уже выполнена, пропускаем", mig_id)
                 continue
 
             # Выполняем новую миграцию
-            self.logger.info(f"Выполнение миграции {mig_id}: {file_path}")
+            self.logger.info("Выполнение миграции %s: %s", mig_id, file_path)
             
             if not self.execute_migration(file_path):
                 return False
@@ -142,10 +143,10 @@ class Migrator:
                     }
                 )
                 self.db.session.commit()
-                self.logger.info(f"Миграция {mig_id} успешно завершена")
+                self.logger.info("Миграция %s успешно завершена", mig_id)
                 
             except Exception as e:
-                self.logger.error(f"Ошибка логирования миграции {mig_id}: {e}")
+                self.logger.error("Ошибка логирования миграции %s: %s", mig_id, e)
                 return False
 
         self.logger.info("Процесс миграций завершен успешно")
@@ -1,6 +1,6 @@
 from . import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy.dialects.postgresql import ENUM, JSONB
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -25,8 +25,20 @@ class Subscription(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
     
     user = db.relationship('User', backref=db.backref('subscriptions', lazy=True))
+    
+    __table_args__ = (
+        db.Index(
+            'idx_subscriptions_user_active', 'user_id',
+            postgresql_where=db.text('is_active')
+        ),
+        db.Index(
+            'idx_subscriptions_deleted_at', 'deleted_at',
+            postgresql_where=db.text('NOT is_active')
+        ),
+    )
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
@@ -36,8 +48,9 @@ class AuditLog(db.Model):
     action = db.Column(db.String(50), nullable=False)
     table_name = db.Column(db.String(50), nullable=False)
     record_id = db.Column(db.Integer, nullable=False)
-    old_values = db.Column(db.JSON)
-    new_values = db.Column(db.JSON)
+    old_values = db.Column(db.JSON().with_variant(JSONB, 'postgresql'))
+    new_values = db.Column(db.JSON().with_variant(JSONB, 'postgresql'))
+    encoding = db.Column(db.String(10), nullable=False, default='full')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('audit_logs', lazy=True))
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+ARCHIVE_COLUMNS = (
+    'id, user_id, name, amount, periodicity, start_date, next_billing_date, '
+    'description, created_at, updated_at, deleted_at'
+)
+
+
+class SubscriptionPurger:
+    """Фоновая очистка мягко удаленных подписок небольшими пачками"""
+
+    def __init__(self, db, retention_days=30, batch_size=500, pause=0.1, archive=True):
+        self.db = db
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive = archive
+        self.logger = logging.getLogger(__name__)
+
+    def purge_batch(self, cutoff):
+        """Удаление (и архивирование) одной пачки строк, возвращает число строк"""
+        # SKIP LOCKED позволяет нескольким воркерам работать параллельно
+        # и не ждать строки, которые сейчас обновляются запросами API
+        select_batch = '''
+            SELECT id FROM subscriptions
+            WHERE NOT is_active AND deleted_at < :cutoff
+            ORDER BY id
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        '''
+        if self.archive:
+            sql = f'''
+                WITH moved AS (
+                    DELETE FROM subscriptions
+                    WHERE id IN ({select_batch})
+                    RETURNING {ARCHIVE_COLUMNS}
+                ), archived AS (
+                    INSERT INTO subscriptions_archive ({ARCHIVE_COLUMNS})
+                    SELECT {ARCHIVE_COLUMNS} FROM moved
+                    ON CONFLICT (id) DO NOTHING
+                )
+                SELECT count(*) FROM moved
+            '''
+        else:
+            sql = f'''
+                WITH moved AS (
+                    DELETE FROM subscriptions
+                    WHERE id IN ({select_batch})
+                    RETURNING id
+                )
+                SELECT count(*) FROM moved
+            '''
+
+        try:
+            purged = self.db.session.execute(
+                text(sql),
+                {'cutoff': cutoff, 'batch_size': self.batch_size}
+            ).scalar()
+            self.db.session.commit()
+            return purged
+        except Exception as e:
+            self.db.session.rollback()
+            self.logger.error("Ошибка очистки подписок: %s", e)
+            raise
+
+    def run(self, max_batches=None):
+        """Очистка всех подписок, удаленных раньше срока хранения"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        total = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            purged = self.purge_batch(cutoff)
+            if not purged:
+                break
+            total += purged
+            batches += 1
+            # Короткая пауза между пачками, чтобы не держать блокировки подряд
+            time.sleep(self.pause)
+
+        self.logger.info("Очистка подписок завершена: удалено %s строк", total)
+        return total
+
+    def start_background(self, app, interval, contexts=None):
+        """Запуск периодической очистки в фоновом потоке.
+
+        contexts - функция, по очереди входящая в контексты приложения
+        для каждой базы (например, для каждого шарда).
+        """
+        def single_context():
+            with app.app_context():
+                yield
+
+        def worker():
+            while True:
+                time.sleep(interval)
+                for _ in (contexts or single_context)():
+                    try:
+                        self.run()
+                    except Exception:
+                        # Ошибка уже залогирована, повторим на следующем цикле
+                        pass
+
+        thread = threading.Thread(target=worker, name='subscription-purger', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,208 @@
+import logging
+import math
+import struct
+import time
+from flask import request, jsonify
+from .readonly import READ_METHODS, is_read_request
+from .sharedmem import SharedSlotTable
+
+# Заголовок файла: счетчики allowed/limited для чтений и записей
+STATS_FORMAT = '4Q'
+STATS_SIZE = 64
+STATS_FIELDS = ('read_allowed', 'read_limited', 'write_allowed', 'write_limited')
+
+# Слот: хэш ключа, количество токенов, время последнего пополнения и
+# время, когда корзина снова будет полной
+SLOT_FORMAT = 'Qddd'
+SLOT_WAYS = 8
+
+
+class SharedBucketStore:
+    """Хранилище token bucket, общее для всех воркеров gunicorn на узле.
+
+    Ключ занимает один из SLOT_WAYS слотов своей корзины. Слот отдается
+    другому ключу, только если он пуст или уже пополнился до burst, так
+    что вытеснение не выдает ключу лишних токенов. Если свободного слота
+    нет, новый ключ списывает токены из слота, который пополнится раньше
+    остальных: лимит становится строже, но не мягче.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.table = SharedSlotTable(
+            path, SLOT_FORMAT, slots=slots, header_size=STATS_SIZE, ways=SLOT_WAYS
+        )
+
+    @staticmethod
+    def choose_slot(key_hash, slots, now):
+        """Слот ключа: (смещение, значения, принадлежит ли слот ключу)"""
+        for offset, values in slots:
+            if values[0] == key_hash:
+                return offset, values, True
+        for offset, values in slots:
+            if values[0] == 0 or values[3] <= now:
+                return offset, None, True
+        offset, values = min(slots, key=lambda slot: slot[1][3])
+        return offset, values, False
+
+    def consume(self, key, rate, burst, cost=1, charge=True):
+        """Списание токенов, возвращает (allowed, retry_after).
+
+        С charge=False корзина только проверяется и не меняется.
+        """
+        now = time.time()
+
+        with self.table.bucket(key) as (key_hash, slots):
+            offset, values, owned = self.choose_slot(key_hash, slots, now)
+            if values is None:
+                tokens, updated = float(burst), now
+            else:
+                stored_hash, tokens, updated, _ = values
+                if not owned:
+                    key_hash = stored_hash
+
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+
+            if charge:
+                full_at = now + (burst - tokens) / rate
+                self.table.pack(offset, key_hash, tokens, now, full_at)
+
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def record(self, kind, allowed):
+        """Обновление общих счетчиков статистики"""
+        index = STATS_FIELDS.index(f"{kind}_{'allowed' if allowed else 'limited'}")
+        field_offset = self.table.header_offset + index * 8
+
+        with self.table.locked(field_offset, 8) as shared:
+            (value,) = struct.unpack_from('Q', shared, field_offset)
+            struct.pack_into('Q', shared, field_offset, value + 1)
+
+    def stats(self):
+        return dict(zip(STATS_FIELDS, struct.unpack_from(STATS_FORMAT, self.table.map, self.table.header_offset)))
+
+
+class RateLimiter:
+    """Token bucket лимитер для blueprint `api`"""
+
+    def __init__(self, app=None):
+        self.store = None
+        self.logger = logging.getLogger(__name__)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.trust_real_ip = app.config['RATELIMIT_TRUST_X_REAL_IP']
+        # (rate в токенах/сек, burst) для каждой области и типа запроса
+        self.limits = {
+            'read': (app.config['RATELIMIT_READ_RATE'], app.config['RATELIMIT_READ_BURST']),
+            'write': (app.config['RATELIMIT_WRITE_RATE'], app.config['RATELIMIT_WRITE_BURST']),
+        }
+        self.global_limits = {
+            'read': (app.config['RATELIMIT_GLOBAL_READ_RATE'], app.config['RATELIMIT_GLOBAL_READ_BURST']),
+            'write': (app.config['RATELIMIT_GLOBAL_WRITE_RATE'], app.config['RATELIMIT_GLOBAL_WRITE_BURST']),
+        }
+        for kind, (rate, burst) in self.limits.items():
+            if rate <= 0 or burst < 1:
+                raise ValueError(f"Лимит {kind}: rate должен быть > 0, burst >= 1")
+        for kind, (rate, burst) in self.global_limits.items():
+            # rate = 0 отключает глобальный лимит
+            if rate < 0 or (rate > 0 and burst < 1):
+                raise ValueError(f"Глобальный лимит {kind}: rate должен быть >= 0, burst >= 1")
+        if self.enabled:
+            self.store = SharedBucketStore(app.config['RATELIMIT_STORAGE_PATH'])
+
+    def client_ip(self):
+        if self.trust_real_ip:
+            real_ip = request.headers.get('X-Real-IP')
+            if real_ip:
+                return real_ip
+        return request.remote_addr or 'unknown'
+
+    def user_id(self):
+        """Пользователь запроса из пути или тела.
+
+        Аутентификации в API нет, поэтому user_id из тела - заявление
+        клиента: чужой бюджет он тратит только в пределах своего лимита
+        по IP. PUT/DELETE подписки списывают бюджет ее владельца в
+        обработчике через check_user.
+        """
+        if request.view_args and 'user_id' in request.view_args:
+            return request.view_args['user_id']
+        if request.method not in READ_METHODS:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                return data.get('user_id')
+        return None
+
+    def check(self):
+        """before_request-хук: 429 с Retry-After при исчерпании лимита"""
+        if not self.enabled:
+            return None
+
+        kind = 'read' if is_read_request() else 'write'
+        rate, burst = self.limits[kind]
+        buckets = [(f"ip:{self.client_ip()}:{kind}", rate, burst)]
+
+        user_id = self.user_id()
+        if user_id is not None:
+            buckets.append((f"user:{user_id}:{kind}", rate, burst))
+
+        global_rate, global_burst = self.global_limits[kind]
+        if global_rate > 0:
+            buckets.append((f"global:{kind}", global_rate, global_burst))
+
+        retry_after = self.consume_all(buckets)
+        limited = retry_after > 0
+        self.store.record(kind, not limited)
+        if not limited:
+            return None
+        return self.limited_response(retry_after)
+
+    def check_user(self, user_id, kind='write'):
+        """Лимит пользователя, известного только обработчику (владелец подписки).
+
+        Возвращает ответ 429 или None; корзины IP и узла уже списаны в check.
+        """
+        if not self.enabled or user_id is None:
+            return None
+        rate, burst = self.limits[kind]
+        retry_after = self.consume_all([(f"user:{user_id}:{kind}", rate, burst)])
+        if not retry_after:
+            return None
+        return self.limited_response(retry_after)
+
+    def consume_all(self, buckets):
+        """Списание из всех корзин, возвращает retry_after (0 - запрос разрешен).
+
+        Сначала все корзины только проверяются, и токены списываются, лишь
+        если запрос проходит везде: клиент сверх своего лимита не тратит
+        общий бюджет узла и бюджет других ключей.
+        """
+        retry_after = 0.0
+        for charge in (False, True):
+            for key, rate, burst in buckets:
+                allowed, wait = self.store.consume(key, rate, burst, charge=charge)
+                if not allowed:
+                    retry_after = max(retry_after, wait)
+            if retry_after > 0:
+                # При гонке с другим воркером часть корзин на втором проходе
+                # могла быть уже списана - это только ужесточает лимит
+                break
+        return retry_after
+
+    @staticmethod
+    def limited_response(retry_after):
+        response = jsonify({'error': 'Too many requests'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def stats(self):
+        if not self.enabled:
+            return {'enabled': False}
+        return {'enabled': True, 'limits': self.limits, 'global_limits': self.global_limits,
+                **self.store.stats()}
@@ -0,0 +1,17 @@
+from flask import current_app, request
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def read_only(view):
+    """Помечает POST-обработчик, который только читает данные"""
+    view.read_only = True
+    return view
+
+
+def is_read_request():
+    """Запрос только читает данные: GET/HEAD/OPTIONS или помеченный обработчик"""
+    if request.method in READ_METHODS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False)
@@ -0,0 +1,198 @@
+import logging
+import random
+import threading
+import time
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from .readonly import is_read_request
+from .sharedmem import SharedSlotTable
+
+PRIMARY_LSN_QUERY = 'SELECT pg_current_wal_lsn()::text'
+
+# Состояние реплики: на сколько байт примененный WAL отстает от LSN primary
+# перед проверкой, работает ли WAL receiver (видно роли с pg_read_all_stats),
+# применено ли все полученное и возраст последней примененной транзакции
+LAG_QUERY = '''
+    SELECT pg_is_in_recovery() AS in_recovery,
+           pg_wal_lsn_diff(CAST(:primary_lsn AS pg_lsn), pg_last_wal_replay_lsn()) AS behind_bytes,
+           EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') AS streaming,
+           pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AS replayed,
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+'''
+
+
+def replica_lag(in_recovery, behind_bytes, streaming, replayed, replay_age):
+    """Отставание реплики в секундах или None, если оно неизвестно.
+
+    Реплика свежая, только если применила WAL, бывший на primary в начале
+    проверки. Равенство receive и replay LSN не говорит, что реплика
+    получила все с primary, поэтому учитывается лишь без LSN primary.
+    Иначе отставание оценивается возрастом последней примененной транзакции.
+    """
+    if not in_recovery:
+        return 0.0
+    if behind_bytes is not None and behind_bytes <= 0:
+        return 0.0
+    if not streaming:
+        return None
+    if behind_bytes is None and replayed:
+        return 0.0
+    if replay_age is None:
+        return None
+    return float(replay_age)
+
+
+class RoutingSession(Session):
+    """Сессия, выбирающая шард пользователя или реплику для текущего запроса"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard = g.get('db_shard')
+            if shard is not None:
+                return self._db.engines[shard]
+            replica = g.get('db_replica')
+            if replica is not None and not self._flushing:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Маршрутизация GET-запросов на read-реплики с учетом отставания"""
+
+    def __init__(self):
+        self.replicas = []
+        self.healthy = []
+        self.lag = {}
+        self.lag_bytes = {}
+        self.pins = None
+        self.logger = logging.getLogger(__name__)
+
+    def configure(self, app):
+        """Регистрация реплик как binds Flask-SQLAlchemy (до db.init_app)"""
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.replicas = []
+        for index, url in enumerate(app.config['DATABASE_REPLICA_URLS']):
+            key = f'replica_{index}'
+            binds[key] = url
+            self.replicas.append(key)
+
+    def init_app(self, app, db):
+        self.db = db
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.max_lag_bytes = app.config['REPLICA_MAX_LAG_BYTES']
+        self.window = app.config['READ_YOUR_WRITES_WINDOW']
+        if not self.replicas:
+            return
+
+        self.pins = SharedSlotTable(app.config['REPLICA_PIN_STORAGE_PATH'], 'Qd')
+        with app.app_context():
+            self.check_replicas()
+        self.start_health_checks(app, app.config['REPLICA_CHECK_INTERVAL'])
+
+    def primary_lsn(self):
+        try:
+            with self.db.engine.connect() as connection:
+                return connection.execute(text(PRIMARY_LSN_QUERY)).scalar()
+        except Exception as e:
+            self.logger.warning("Не удалось получить LSN primary: %s", e)
+            return None
+
+    def check_replicas(self):
+        """Проверка доступности и отставания реплик, обновление ротации"""
+        healthy = []
+        primary_lsn = self.primary_lsn()
+        for key in self.replicas:
+            try:
+                with self.db.engines[key].connect() as connection:
+                    state = connection.execute(text(LAG_QUERY), {'primary_lsn': primary_lsn}).one()
+            except Exception as e:
+                self.logger.warning("Реплика %s недоступна: %s", key, e)
+                self.lag[key] = None
+                self.lag_bytes[key] = None
+                continue
+
+            lag = replica_lag(*state)
+            behind = None if state.behind_bytes is None else max(0, int(state.behind_bytes))
+            self.lag[key] = lag
+            self.lag_bytes[key] = behind
+            if lag is None:
+                self.logger.warning("Реплика %s не получает WAL или отставание неизвестно, "
+                                    "исключена из ротации", key)
+            elif behind is not None and behind > self.max_lag_bytes:
+                self.logger.warning("Реплика %s отстает на %d байт WAL, исключена из ротации", key, behind)
+            elif lag <= self.max_lag:
+                healthy.append(key)
+            else:
+                self.logger.warning("Реплика %s отстает на %.1f с, исключена из ротации", key, lag)
+
+        self.healthy = healthy
+        return healthy
+
+    def start_health_checks(self, app, interval):
+        def worker():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    self.check_replicas()
+
+        thread = threading.Thread(target=worker, name='replica-health', daemon=True)
+        thread.start()
+        return thread
+
+    def mark_write(self, user_id):
+        """Закрепление чтений пользователя за primary после его записи"""
+        if self.pins is not None and user_id is not None:
+            self.pins.write(f'user:{user_id}', time.time() + self.window)
+
+    def is_pinned(self, user_id):
+        if user_id is None:
+            return False
+        with self.pins.bucket(f'user:{user_id}') as (_, slots):
+            (_, (_, expires_at)), = slots
+        # Срок проверяется, даже если слот занят другим пользователем: его
+        # запись могла вытеснить метку этого пользователя, и тогда чтение
+        # безопаснее отправить на primary
+        return expires_at > time.time()
+
+    def route_read(self, user_ids):
+        """Выбор реплики, если ни один из пользователей не закреплен за primary"""
+        healthy = self.healthy
+        if not healthy or any(self.is_pinned(user_id) for user_id in user_ids):
+            return None
+        g.db_replica = random.choice(healthy)
+        return g.db_replica
+
+    def route_request(self):
+        """before_request-хук: выбор реплики для чтения"""
+        if not self.healthy or not is_read_request():
+            return None
+
+        user_id = (request.view_args or {}).get('user_id')
+        if user_id is None and 'user_id' in request.args:
+            # Поиск и выгрузка передают пользователя в строке запроса
+            try:
+                user_id = int(request.args['user_id'])
+            except ValueError:
+                # Обработчик ответит 400
+                return None
+        if user_id is None and request.is_json:
+            # Пакетные чтения передают пользователей в теле запроса
+            data = request.get_json(silent=True)
+            if isinstance(data, dict) and isinstance(data.get('user_ids'), list):
+                self.route_read(data['user_ids'])
+                return None
+
+        self.route_read([user_id])
+        return None
+
+    def read_engine(self):
+        """Движок для тяжелых чтений вне запроса: здоровая реплика или primary"""
+        healthy = self.healthy
+        if healthy:
+            return self.db.engines[random.choice(healthy)]
+        return self.db.engine
+
+    def stats(self):
+        return {'replicas': self.replicas, 'healthy': self.healthy, 'lag': self.lag,
+                'lag_bytes': self.lag_bytes}
@@ -1,21 +1,79 @@
-from flask import Blueprint, request, jsonify
-from . import db
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from . import db, limiter, replica_router, shard_router
 from .models import Subscription, User, AuditLog
+from .audit import DELTA, encode_values, get_record_history, get_record_state
+from .search import DEFAULT_LIMIT, MAX_LIMIT, search_subscriptions
+from .export import EXPORT_TABLES, parse_date, stream_sharded_export
+from .readonly import read_only
+from sqlalchemy import text
 from datetime import datetime
 import logging
 
 bp = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
 
+MAX_BATCH_USERS = 500
+DEFAULT_BATCH_LIMIT = 100
+MAX_BATCH_LIMIT = 1000
+
+# Не больше :limit активных подписок на пользователя одним запросом
+BATCH_SUBSCRIPTIONS_QUERY = '''
+    SELECT id, user_id, name, amount, periodicity, start_date, next_billing_date, created_at
+    FROM (
+        SELECT s.*, row_number() OVER (PARTITION BY user_id ORDER BY id) AS position
+        FROM subscriptions s
+        WHERE user_id = ANY(:user_ids) AND is_active
+    ) ranked
+    WHERE position <= :limit
+    ORDER BY user_id, id
+'''
+
+@bp.before_request
+def apply_rate_limit():
+    return limiter.check()
+
+@bp.before_request
+def route_to_shard():
+    return shard_router.route_request()
+
+@bp.before_request
+def route_to_replica():
+    return replica_router.route_request()
+
+def serialize_subscription(sub):
+    return {
+        'id': sub.id,
+        'name': sub.name,
+        'amount': float(sub.amount),
+        'periodicity': sub.periodicity,
+        'start_date': sub.start_date.isoformat(),
+        'next_billing_date': sub.next_billing_date.isoformat(),
+        'created_at': sub.created_at.isoformat()
+    }
+
+def user_id_arg():
+    """Optional user_id query parameter (ValueError if it is not an integer)"""
+    value = request.args.get('user_id')
+    return None if value is None else int(value)
+
 def log_audit(user_id, action, table_name, record_id, old_values=None, new_values=None):
     """Helper function to log audit actions"""
+    encoding = current_app.config['AUDIT_ENCODING']
+    # A delta is only valid if earlier entries can rebuild the fields it omits
+    state = None
+    if encoding == DELTA and action in ('UPDATE', 'DELETE'):
+        state = get_record_state(table_name, record_id)
+    old_values, new_values, encoding = encode_values(
+        action, old_values, new_values, encoding, state
+    )
     audit_log = AuditLog(
         user_id=user_id,
         action=action,
         table_name=table_name,
         record_id=record_id,
         old_values=old_values,
-        new_values=new_values
+        new_values=new_values,
+        encoding=encoding
     )
     db.session.add(audit_log)
 
@@ -64,10 +122,12 @@ def create_subscription():
                 'name': data['name'],
                 'amount': float(data['amount']),
                 'periodicity': data['periodicity'],
-                'start_date': data['start_date']
+                'start_date': data['start_date'],
+                'next_billing_date': next_billing_date.isoformat()
             }
         )
         db.session.commit()
+        replica_router.mark_write(data['user_id'])
         
         return jsonify({
             'id': subscription.id,
@@ -76,7 +136,7 @@ def create_subscription():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error creating subscription: {str(e)}")
+        logger.error("Error creating subscription: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @bp.route('/users/<int:user_id>/subscriptions', methods=['GET'])
@@ -87,29 +147,111 @@ def get_subscriptions(user_id):
             is_active=True
         ).all()
         
-        result = []
-        for sub in subscriptions:
-            result.append({
-                'id': sub.id,
-                'name': sub.name,
-                'amount': float(sub.amount),
-                'periodicity': sub.periodicity,
-                'start_date': sub.start_date.isoformat(),
-                'next_billing_date': sub.next_billing_date.isoformat(),
-                'created_at': sub.created_at.isoformat()
-            })
+        result = [serialize_subscription(sub) for sub in subscriptions]
         
         return jsonify({'subscriptions': result})
         
     except Exception as e:
-        logger.error(f"Error fetching subscriptions: {str(e)}")
+        logger.error("Error fetching subscriptions: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+@bp.route('/users/subscriptions:batchGet', methods=['POST'])
+@read_only
+def batch_get_subscriptions():
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get('user_ids')
+    
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({'error': 'user_ids must be a non-empty list'}), 400
+    if len(user_ids) > MAX_BATCH_USERS:
+        return jsonify({'error': f'At most {MAX_BATCH_USERS} user_ids per request'}), 400
+    if not all(isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids):
+        return jsonify({'error': 'user_ids must be integers'}), 400
+    
+    limit = data.get('limit', DEFAULT_BATCH_LIMIT)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_BATCH_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_BATCH_LIMIT}'}), 400
+    
+    user_ids = list(dict.fromkeys(user_ids))
+    
+    try:
+        if shard_router.enabled:
+            # Один запрос на каждый затронутый шард
+            rows = []
+            for shard, shard_user_ids in shard_router.group_users(user_ids).items():
+                with db.engines[shard].connect() as connection:
+                    rows.extend(connection.execute(
+                        text(BATCH_SUBSCRIPTIONS_QUERY),
+                        {'user_ids': shard_user_ids, 'limit': limit}
+                    ).all())
+        else:
+            rows = db.session.execute(
+                text(BATCH_SUBSCRIPTIONS_QUERY),
+                {'user_ids': user_ids, 'limit': limit}
+            ).all()
+        
+        users = {str(user_id): {'subscriptions': []} for user_id in user_ids}
+        for row in rows:
+            users[str(row.user_id)]['subscriptions'].append(serialize_subscription(row))
+        
+        return jsonify({'users': users})
+        
+    except Exception as e:
+        logger.error("Error fetching subscriptions batch: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/subscriptions/search', methods=['GET'])
+def search_subscriptions_route():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Missing required parameter: q'}), 400
+    
+    try:
+        user_id = user_id_arg()
+    except ValueError:
+        return jsonify({'error': 'user_id must be an integer'}), 400
+    if user_id is None and shard_router.enabled:
+        return jsonify({'error': 'Missing required parameter: user_id'}), 400
+    
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    
+    try:
+        rows, next_cursor = search_subscriptions(
+            db.session,
+            q,
+            user_id=user_id,
+            prefix=request.args.get('prefix', '').lower() in ('1', 'true'),
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except Exception as e:
+        logger.error("Error searching subscriptions: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+    
+    result = [
+        {**serialize_subscription(row), 'score': round(row.score, 4)}
+        for row in rows
+    ]
+    
+    return jsonify({'subscriptions': result, 'next_cursor': next_cursor})
+
 @bp.route('/subscriptions/<int:subscription_id>', methods=['PUT'])
 def update_subscription(subscription_id):
     try:
         data = request.get_json()
-        subscription = Subscription.query.get_or_404(subscription_id)
+        subscription = Subscription.query.filter_by(
+            id=subscription_id,
+            is_active=True
+        ).first()
+        if subscription is None:
+            return jsonify({'error': 'Subscription not found'}), 404
+        
+        # The owner is only known after the lookup
+        limited = limiter.check_user(subscription.user_id)
+        if limited is not None:
+            return limited
         
         old_values = {
             'amount': float(subscription.amount),
@@ -152,18 +294,29 @@ def update_subscription(subscription_id):
             new_values=new_values
         )
         db.session.commit()
+        replica_router.mark_write(subscription.user_id)
         
         return jsonify({'message': 'Subscription updated successfully'})
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating subscription: {str(e)}")
+        logger.error("Error updating subscription: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @bp.route('/subscriptions/<int:subscription_id>', methods=['DELETE'])
 def delete_subscription(subscription_id):
     try:
-        subscription = Subscription.query.get_or_404(subscription_id)
+        subscription = Subscription.query.filter_by(
+            id=subscription_id,
+            is_active=True
+        ).first()
+        if subscription is None:
+            return jsonify({'error': 'Subscription not found'}), 404
+        
+        # The owner is only known after the lookup
+        limited = limiter.check_user(subscription.user_id)
+        if limited is not None:
+            return limited
         
         old_values = {
             'name': subscription.name,
@@ -171,8 +324,10 @@ def delete_subscription(subscription_id):
             'periodicity': subscription.periodicity
         }
         
+        # Soft delete: the row is physically removed later by the purge job
         user_id = subscription.user_id
-        db.session.delete(subscription)
+        subscription.is_active = False
+        subscription.deleted_at = datetime.utcnow()
         db.session.commit()
         
         # Log audit
@@ -184,13 +339,71 @@ def delete_subscription(subscription_id):
             old_values=old_values
         )
         db.session.commit()
+        replica_router.mark_write(user_id)
         
         return jsonify({'message': 'Subscription deleted successfully'})
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error deleting subscription: {str(e)}")
+        logger.error("Error deleting subscription: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/subscriptions/<int:subscription_id>/audit', methods=['GET'])
+def get_subscription_audit(subscription_id):
+    try:
+        history = get_record_history('subscriptions', subscription_id)
+        return jsonify({'history': history})
+        
+    except Exception as e:
+        logger.error("Error fetching audit history: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/exports/<table>', methods=['GET'])
+def export_table(table):
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': f'Unknown table. Use: {", ".join(EXPORT_TABLES)}'}), 404
+    
+    try:
+        date_from = parse_date(request.args.get('date_from'))
+        date_to = parse_date(request.args.get('date_to'))
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    try:
+        user_id = user_id_arg()
+    except ValueError:
+        return jsonify({'error': 'user_id must be an integer'}), 400
+    
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    engines = shard_router.request_engines() or [replica_router.read_engine()]
+    chunks = stream_sharded_export(
+        engines,
+        table,
+        compress=compress,
+        user_id=user_id,
+        date_from=date_from,
+        date_to=date_to
+    )
+    
+    # COPY идет мимо ORM и стримится клиенту чанками
+    filename = f'{table}.csv.gz' if compress else f'{table}.csv'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/ratelimit/stats', methods=['GET'])
+def rate_limit_stats():
+    return jsonify(limiter.stats())
+
+@bp.route('/replicas/stats', methods=['GET'])
+def replica_stats():
+    return jsonify(replica_router.stats())
+
+@bp.route('/logging/stats', methods=['GET'])
+def logging_stats():
+    return jsonify(current_app.extensions['log_handler'].stats())
+
 # Добавим тестовый корневой маршрут
 @bp.route('/')
 def index():
@@ -199,6 +412,8 @@ def index():
         'endpoints': {
             'create_subscription': 'POST /subscriptions',
             'get_subscriptions': 'GET /users/<user_id>/subscriptions', 
+            'batch_get_subscriptions': 'POST /users/subscriptions:batchGet',
+            'search_subscriptions': 'GET /subscriptions/search?q=&user_id=',
             'update_subscription': 'PUT /subscriptions/<subscription_id>',
             'delete_subscription': 'DELETE /subscriptions/<subscription_id>'
         }
@@ -0,0 +1,108 @@
+import base64
+import binascii
+import json
+from sqlalchemy import text
+
+# Короче трех символов триграммы не работают, такие запросы ищутся по префиксу
+MIN_TRIGRAM_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+COLUMNS = 'id, name, amount, periodicity, start_date, next_billing_date, created_at'
+
+# lower(name) в C-сортировке: LIKE по префиксу и ORDER BY идут по индексу
+# (user_id, lower(name) COLLATE "C", id), а без user_id - по (lower(name) COLLATE "C", id)
+PREFIX_QUERY = '''
+    SELECT {columns}, lower(name) COLLATE "C" AS sort_name, 1.0::float8 AS score
+    FROM subscriptions
+    WHERE is_active
+      AND lower(name) COLLATE "C" LIKE :lower_prefix ESCAPE '\\'
+      {user_filter}
+      {after}
+    ORDER BY lower(name) COLLATE "C", id
+    LIMIT :limit
+'''
+
+# Совпадение по названию весит больше описания, префиксное совпадение - больше всего
+SIMILARITY_QUERY = '''
+    SELECT * FROM (
+        SELECT {columns},
+               (GREATEST(similarity(name, :q), similarity(COALESCE(description, ''), :q) * 0.5)
+                + CASE WHEN name ILIKE :prefix ESCAPE '\\' THEN 1 ELSE 0 END)::float8 AS score
+        FROM subscriptions
+        WHERE is_active
+          {user_filter}
+          AND (name % :q OR description % :q OR name ILIKE :contains ESCAPE '\\')
+    ) matches
+    WHERE TRUE {after}
+    ORDER BY score DESC, id
+    LIMIT :limit
+'''
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def encode_cursor(mode, key):
+    return base64.urlsafe_b64encode(json.dumps({'m': mode, 'k': key}).encode()).decode()
+
+
+def decode_cursor(cursor, mode):
+    """Ключ последней строки предыдущей страницы (ValueError при ошибке)"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(data, dict) or data.get('m') != mode:
+        raise ValueError('Invalid cursor')
+    key = data.get('k')
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError('Invalid cursor')
+
+    first, last_id = key
+    first_types = str if mode == 'prefix' else (int, float)
+    for value, types in ((first, first_types), (last_id, int)):
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ValueError('Invalid cursor')
+    return key
+
+
+def search_subscriptions(session, q, user_id=None, prefix=False, limit=DEFAULT_LIMIT, cursor=None):
+    """Поиск активных подписок, возвращает (строки, курсор следующей страницы)"""
+    mode = 'prefix' if prefix or len(q) < MIN_TRIGRAM_LENGTH else 'similar'
+    params = {
+        'q': q,
+        'prefix': escape_like(q) + '%',
+        'lower_prefix': escape_like(q.lower()) + '%',
+        'contains': '%' + escape_like(q) + '%',
+        'user_id': user_id,
+        'limit': limit + 1
+    }
+
+    after = ''
+    if cursor:
+        first, last_id = decode_cursor(cursor, mode)
+        params['after_id'] = last_id
+        if mode == 'prefix':
+            params['after_name'] = first
+            after = 'AND (lower(name) COLLATE "C", id) > (:after_name COLLATE "C", :after_id)'
+        else:
+            params['after_score'] = float(first)
+            after = 'AND (score < :after_score OR (score = :after_score AND id > :after_id))'
+
+    query = PREFIX_QUERY if mode == 'prefix' else SIMILARITY_QUERY
+    sql = query.format(
+        columns=COLUMNS,
+        user_filter='AND user_id = :user_id' if user_id is not None else '',
+        after=after
+    )
+    rows = session.execute(text(sql), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key = [last.sort_name, last.id] if mode == 'prefix' else [last.score, last.id]
+        next_cursor = encode_cursor(mode, key)
+    return rows, next_cursor
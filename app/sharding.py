@@ -0,0 +1,417 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import g, jsonify, request
+from sqlalchemy import text
+
+# Шаг последовательностей id: шард i выдает id = i + 1 (mod SHARD_ID_STRIDE),
+# поэтому id уникальны между шардами и строки можно переносить без смены id
+SHARD_ID_STRIDE = 64
+
+# Виртуальных корзин на шард при первом запуске. Число корзин потом не
+# меняется: оно кратно исходному числу шардов, поэтому корзина bucket % n
+# дает пользователю тот же шард, что и прежний хэш по модулю n
+SHARD_BUCKETS_PER_SHARD = 256
+
+# Таблицы пользователя в порядке вставки (удаление - в обратном порядке)
+USER_TABLES = (
+    ('users', 'id'),
+    ('subscriptions', 'user_id'),
+    ('audit_logs', 'user_id'),
+)
+
+
+class ShardRouter:
+    """Распределение пользователей по шардам Postgres.
+
+    Хэш user_id выбирает виртуальную корзину, а таблица shard_buckets в
+    основной базе - шард корзины, так что новый шард не перемещает уже
+    размещенных пользователей. Таблица shard_directory хранит исключения
+    для перенесенных пользователей.
+    Записи shard_directory кэшируются в процессе, а устаревший кэш
+    исправляют метки shard_forwarding, которые перенос оставляет на
+    исходном шарде.
+    """
+
+    def __init__(self):
+        self.shards = []
+        self.bucket_map = []
+        self.directory_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def enabled(self):
+        return bool(self.shards)
+
+    def configure(self, app):
+        """Регистрация шардов как binds Flask-SQLAlchemy (до db.init_app)"""
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.shards = []
+        for index, url in enumerate(app.config['SHARD_DATABASE_URLS']):
+            key = f'shard_{index}'
+            binds[key] = url
+            self.shards.append(key)
+        if len(self.shards) > SHARD_ID_STRIDE:
+            raise ValueError(f"Не больше {SHARD_ID_STRIDE} шардов")
+
+    def init_app(self, app, db):
+        self.db = db
+        self.cache_ttl = app.config['SHARD_DIRECTORY_CACHE_TTL']
+        self.cache_size = app.config['SHARD_DIRECTORY_CACHE_SIZE']
+
+    @contextmanager
+    def use_shard(self, app, key):
+        """Контекст приложения, в котором db.session работает с шардом"""
+        with app.app_context():
+            g.db_shard = key
+            yield key
+
+    def each_shard(self, app):
+        """Основная база и все шарды по очереди (для миграций и фоновых задач)"""
+        for key in [None] + self.shards:
+            with self.use_shard(app, key):
+                yield key
+
+    def load_buckets(self):
+        """Загрузка карты корзин из основной базы (при первом запуске - создание)"""
+        if not self.enabled:
+            return
+        with self.db.engine.begin() as connection:
+            # ON CONFLICT: воркеры, стартующие одновременно, создают одну карту
+            connection.execute(text('''
+                INSERT INTO shard_buckets (bucket, shard)
+                SELECT bucket, bucket % :shards FROM generate_series(0, :buckets - 1) AS bucket
+                WHERE NOT EXISTS (SELECT 1 FROM shard_buckets)
+                ON CONFLICT (bucket) DO NOTHING
+            '''), {'shards': len(self.shards), 'buckets': len(self.shards) * SHARD_BUCKETS_PER_SHARD})
+            rows = connection.execute(text('SELECT bucket, shard FROM shard_buckets ORDER BY bucket')).all()
+        self.set_buckets(rows)
+
+    def set_buckets(self, rows):
+        """Проверка и установка карты [(корзина, индекс шарда)].
+
+        Шард, которого нет в SHARD_DATABASE_URLS, - ошибка конфигурации:
+        запуск с ним отправил бы пользователей его корзин не туда.
+        """
+        bucket_map = [shard for _, shard in rows]
+        if not rows or [bucket for bucket, _ in rows] != list(range(len(rows))):
+            raise RuntimeError("Таблица shard_buckets повреждена: корзины должны идти подряд с 0")
+        missing = sorted({shard for shard in bucket_map if not 0 <= shard < len(self.shards)})
+        if missing:
+            raise RuntimeError(
+                f"shard_buckets ссылается на шарды {missing}, настроено {len(self.shards)}"
+            )
+        self.bucket_map = bucket_map
+        self.logger.info("Карта шардов: %s корзин на %s шардов", len(bucket_map), len(self.shards))
+
+    def hash_shard(self, user_id):
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        return self.bucket_map[int.from_bytes(digest, 'little') % len(self.bucket_map)]
+
+    @staticmethod
+    def parse_user_id(user_id):
+        """user_id из URL или JSON как int (ValueError для нечисловых значений)"""
+        if isinstance(user_id, bool) or not isinstance(user_id, (int, str)):
+            raise ValueError(f"Invalid user_id: {user_id!r}")
+        return int(user_id)
+
+    def cache_directory(self, user_id, override):
+        """Запись в LRU-кэш shard_directory не больше cache_size пользователей"""
+        with self.cache_lock:
+            self.directory_cache[user_id] = (override, time.time() + self.cache_ttl)
+            self.directory_cache.move_to_end(user_id)
+            while len(self.directory_cache) > self.cache_size:
+                self.directory_cache.popitem(last=False)
+
+    def cached_directory(self, user_id):
+        """(найдено, исключение) из кэша shard_directory"""
+        with self.cache_lock:
+            cached = self.directory_cache.get(user_id)
+            if cached is None or cached[1] < time.time():
+                return False, None
+            self.directory_cache.move_to_end(user_id)
+            return True, cached[0]
+
+    def forget_user(self, user_id):
+        with self.cache_lock:
+            self.directory_cache.pop(user_id, None)
+
+    def shard_for_user(self, user_id, use_cache=True):
+        """Ключ bind шарда пользователя с учетом shard_directory.
+
+        Шард из кэша проверяется по меткам shard_forwarding: другой процесс
+        или узел мог перенести пользователя после заполнения кэша. Это
+        лишний запрос по первичному ключу к шарду на каждое попадание в
+        кэш; кэш при этом экономит запрос к основной базе, которая одна на
+        все шарды, а шарды масштабируются вместе с нагрузкой.
+        """
+        user_id = self.parse_user_id(user_id)
+        found, override = self.cached_directory(user_id) if use_cache else (False, None)
+        if not found:
+            with self.db.engine.connect() as connection:
+                override = connection.execute(
+                    text('SELECT shard FROM shard_directory WHERE user_id = :user_id'),
+                    {'user_id': user_id}
+                ).scalar()
+            self.cache_directory(user_id, override)
+
+        key = self.shards[override if override is not None else self.hash_shard(user_id)]
+        if found:
+            key = self.follow_forwarding(user_id, key)
+        return key
+
+    def follow_forwarding(self, user_id, key):
+        """Шард пользователя по меткам переноса, начиная с key"""
+        for _ in self.shards:
+            with self.db.engines[key].connect() as connection:
+                forwarded = connection.execute(
+                    text('SELECT shard FROM shard_forwarding WHERE user_id = :user_id'),
+                    {'user_id': user_id}
+                ).scalar()
+            if forwarded is None:
+                return key
+            self.cache_directory(user_id, forwarded)
+            key = self.shards[forwarded]
+        return key
+
+    def group_users(self, user_ids):
+        """Разбиение списка пользователей по шардам: {ключ шарда: [user_id]}.
+
+        Пользователи без записи в кэше ищутся в shard_directory одним
+        запросом; шарды из кэша проверяются по shard_forwarding одним
+        запросом на шард.
+        """
+        overrides = {}
+        missing = []
+        cached = set()
+        for user_id in user_ids:
+            found, override = self.cached_directory(user_id)
+            if found:
+                overrides[user_id] = override
+                cached.add(user_id)
+            else:
+                missing.append(user_id)
+
+        if missing:
+            with self.db.engine.connect() as connection:
+                directory = dict(connection.execute(
+                    text('SELECT user_id, shard FROM shard_directory WHERE user_id = ANY(:user_ids)'),
+                    {'user_ids': missing}
+                ).all())
+            for user_id in missing:
+                overrides[user_id] = directory.get(user_id)
+                self.cache_directory(user_id, overrides[user_id])
+
+        groups = {}
+        for user_id in user_ids:
+            override = overrides[user_id]
+            key = self.shards[override if override is not None else self.hash_shard(user_id)]
+            groups.setdefault(key, []).append(user_id)
+
+        for _ in self.shards:
+            forwarded = {}
+            for key, shard_user_ids in groups.items():
+                check = [user_id for user_id in shard_user_ids if user_id in cached]
+                if not check:
+                    continue
+                with self.db.engines[key].connect() as connection:
+                    forwarded[key] = dict(connection.execute(
+                        text('SELECT user_id, shard FROM shard_forwarding WHERE user_id = ANY(:user_ids)'),
+                        {'user_ids': check}
+                    ).all())
+            if not any(forwarded.values()):
+                break
+
+            # Перенесенные пользователи переходят в группу нового шарда и
+            # проверяются уже там
+            moved = {}
+            for key, targets in forwarded.items():
+                groups[key] = [user_id for user_id in groups[key] if user_id not in targets]
+                for user_id, shard in targets.items():
+                    self.cache_directory(user_id, shard)
+                    moved.setdefault(self.shards[shard], []).append(user_id)
+            cached = {user_id for user_ids in moved.values() for user_id in user_ids}
+            for key, shard_user_ids in moved.items():
+                groups.setdefault(key, []).extend(shard_user_ids)
+
+        return {key: shard_user_ids for key, shard_user_ids in groups.items() if shard_user_ids}
+
+    def locate(self, query, params, record_id=None):
+        """Поиск шарда, где запрос возвращает строку (сначала шард из id)"""
+        keys = list(self.shards)
+        if record_id is not None:
+            hint = (int(record_id) - 1) % SHARD_ID_STRIDE
+            if hint < len(keys):
+                keys.insert(0, keys.pop(hint))
+
+        for key in keys:
+            with self.db.engines[key].connect() as connection:
+                if connection.execute(text(query), params).first() is not None:
+                    return key
+        return None
+
+    def locate_subscription(self, subscription_id):
+        return self.locate(
+            'SELECT 1 FROM subscriptions WHERE id = :id',
+            {'id': subscription_id},
+            record_id=subscription_id
+        )
+
+    def request_user_id(self):
+        if request.view_args and 'user_id' in request.view_args:
+            return request.view_args['user_id']
+        # Сырое значение: нечисловой user_id дает 400, а не выгрузку всех шардов
+        user_id = request.args.get('user_id')
+        if user_id is None and request.method in ('POST', 'PUT'):
+            data = request.get_json(silent=True)
+            if isinstance(data, dict):
+                user_id = data.get('user_id')
+        return user_id
+
+    def route_request(self):
+        """before_request-хук: привязка db.session к шарду пользователя"""
+        if not self.enabled:
+            return None
+
+        user_id = self.request_user_id()
+        if user_id is not None:
+            try:
+                g.db_shard = self.shard_for_user(user_id)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'user_id must be an integer'}), 400
+            return None
+
+        subscription_id = (request.view_args or {}).get('subscription_id')
+        if subscription_id is not None:
+            g.db_shard = self.locate_subscription(subscription_id)
+        return None
+
+    def request_engines(self):
+        """Движки для выгрузки: шард запроса, все шарды или None без шардинга"""
+        if not self.enabled:
+            return None
+        shard = g.get('db_shard')
+        if shard is not None:
+            return [self.db.engines[shard]]
+        return [self.db.engines[key] for key in self.shards]
+
+    def configure_sequences(self, key):
+        """Перевод последовательностей шарда на шаг SHARD_ID_STRIDE"""
+        offset = self.shards.index(key) + 1
+        with self.db.engines[key].begin() as connection:
+            for table, _ in USER_TABLES:
+                sequence = f'{table}_id_seq'
+                increment = connection.execute(
+                    text('SELECT increment_by FROM pg_sequences WHERE sequencename = :name'),
+                    {'name': sequence}
+                ).scalar()
+                if increment is None or increment == SHARD_ID_STRIDE:
+                    continue
+
+                current = connection.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM {table}')).scalar()
+                start = (current // SHARD_ID_STRIDE) * SHARD_ID_STRIDE + offset
+                if start <= current:
+                    start += SHARD_ID_STRIDE
+                connection.execute(text(f'ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_ID_STRIDE}'))
+                connection.execute(text('SELECT setval(:name, :start, false)'),
+                                   {'name': sequence, 'start': start})
+                self.logger.info(
+                    "Шард %s: %s начинается с %s с шагом %s", key, sequence, start, SHARD_ID_STRIDE
+                )
+
+
+class ShardRebalancer:
+    """Онлайн-перенос строк пользователя между шардами.
+
+    Строки пользователя блокируются на исходном шарде (FOR UPDATE на users
+    блокирует и вставки с внешним ключом), копируются на целевой шард,
+    после чего shard_directory переключается и исходные строки удаляются.
+    Записи пользователя, ожидавшие блокировку, завершатся ошибкой и
+    после повтора попадут на новый шард.
+    """
+
+    def __init__(self, db, router):
+        self.db = db
+        self.router = router
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _insert(connection, table, rows):
+        for row in rows:
+            values = {
+                column: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for column, value in row.items()
+            }
+            columns = ', '.join(values)
+            placeholders = ', '.join(f':{column}' for column in values)
+            connection.execute(text(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'), values)
+
+    def move_user(self, user_id, target_index):
+        source = self.router.shard_for_user(user_id, use_cache=False)
+        target = self.router.shards[target_index]
+        if source == target:
+            self.logger.info("Пользователь %s уже на шарде %s", user_id, target)
+            return 0
+
+        moved = 0
+        with self.db.engines[source].connect() as source_connection:
+            source_tx = source_connection.begin()
+            try:
+                rows = {}
+                for table, column in USER_TABLES:
+                    rows[table] = [
+                        dict(row) for row in source_connection.execute(
+                            text(f'SELECT * FROM {table} WHERE {column} = :user_id ORDER BY id FOR UPDATE'),
+                            {'user_id': user_id}
+                        ).mappings()
+                    ]
+                if not rows['users']:
+                    raise ValueError(f"Пользователь {user_id} не найден на шарде {source}")
+
+                # Целевой шард очищается от остатков прерванного переноса
+                # и от метки, если пользователь уже уходил с этого шарда
+                with self.db.engines[target].begin() as target_connection:
+                    target_connection.execute(
+                        text('DELETE FROM shard_forwarding WHERE user_id = :user_id'),
+                        {'user_id': user_id}
+                    )
+                    for table, column in reversed(USER_TABLES):
+                        target_connection.execute(
+                            text(f'DELETE FROM {table} WHERE {column} = :user_id'),
+                            {'user_id': user_id}
+                        )
+                    for table, _ in USER_TABLES:
+                        self._insert(target_connection, table, rows[table])
+                        moved += len(rows[table])
+
+                with self.db.engine.begin() as directory_connection:
+                    directory_connection.execute(text('''
+                        INSERT INTO shard_directory (user_id, shard) VALUES (:user_id, :shard)
+                        ON CONFLICT (user_id) DO UPDATE SET shard = EXCLUDED.shard
+                    '''), {'user_id': user_id, 'shard': target_index})
+                self.router.forget_user(int(user_id))
+
+                for table, column in reversed(USER_TABLES):
+                    source_connection.execute(
+                        text(f'DELETE FROM {table} WHERE {column} = :user_id'),
+                        {'user_id': user_id}
+                    )
+                # Метка видна вместе с удалением строк: процессы с устаревшим
+                # кэшем находят по ней новый шард
+                source_connection.execute(text('''
+                    INSERT INTO shard_forwarding (user_id, shard) VALUES (:user_id, :shard)
+                    ON CONFLICT (user_id) DO UPDATE SET shard = EXCLUDED.shard, moved_at = now()
+                '''), {'user_id': user_id, 'shard': target_index})
+                source_tx.commit()
+            except Exception as e:
+                source_tx.rollback()
+                self.logger.error("Ошибка переноса пользователя %s: %s", user_id, e)
+                raise
+
+        self.logger.info("Пользователь %s перенесен %s -> %s: %s строк", user_id, source, target, moved)
+        return moved
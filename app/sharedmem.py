@@ -0,0 +1,98 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+# Секрет узла в начале файла: без него нельзя подобрать ключи с одним слотом
+SECRET_SIZE = 16
+
+
+class SharedSlotTable:
+    """Таблица фиксированных слотов в разделяемом mmap-файле.
+
+    Файл открывается всеми воркерами gunicorn на узле, поэтому данные
+    общие для всех процессов. Ключ хэшируется с секретом узла и попадает
+    в корзину из ways слотов; что делать, если в корзине нет слота ключа,
+    решает вызывающий код.
+    """
+
+    def __init__(self, path, slot_format, slots=65536, header_size=0, ways=1):
+        if slots % ways:
+            raise ValueError("Число слотов должно делиться на ways")
+        self.path = path
+        self.slot_format = slot_format
+        self.slot_size = struct.calcsize(slot_format)
+        self.slots = slots
+        self.ways = ways
+        self.buckets = slots // ways
+        self.header_offset = SECRET_SIZE
+        self.slots_offset = SECRET_SIZE + header_size
+        self.size = self.slots_offset + slots * self.slot_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < self.size:
+            os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size, mmap.MAP_SHARED)
+        # fcntl-блокировки работают между процессами, но не между потоками
+        self.thread_lock = threading.Lock()
+        self.secret = self.load_secret()
+
+    def load_secret(self):
+        """Секрет из файла; первый открывший файл процесс создает его"""
+        with self.locked(0, SECRET_SIZE) as shared:
+            secret = bytes(shared[:SECRET_SIZE])
+            if not any(secret):
+                secret = os.urandom(SECRET_SIZE)
+                shared[:SECRET_SIZE] = secret
+        return secret
+
+    def key_hash(self, key):
+        """Хэш ключа с секретом узла, общий для процессов (0 означает пустой слот)"""
+        digest = hashlib.blake2b(key.encode(), digest_size=8, key=self.secret).digest()
+        return int.from_bytes(digest, 'little') | 1
+
+    def bucket_offset(self, key_hash):
+        return self.slots_offset + (key_hash % self.buckets) * self.ways * self.slot_size
+
+    @contextmanager
+    def locked(self, offset, length):
+        """Эксклюзивная блокировка диапазона байт для потоков и процессов"""
+        with self.thread_lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, length, offset)
+            try:
+                yield self.map
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, length, offset)
+
+    @contextmanager
+    def bucket(self, key):
+        """Заблокированная корзина ключа: (хэш ключа, [(смещение слота, значения)])"""
+        key_hash = self.key_hash(key)
+        start = self.bucket_offset(key_hash)
+        length = self.ways * self.slot_size
+        with self.locked(start, length) as shared:
+            values = struct.iter_unpack(self.slot_format, shared[start:start + length])
+            yield key_hash, list(zip(range(start, start + length, self.slot_size), values))
+
+    def pack(self, offset, *values):
+        """Запись слота; вызывается внутри bucket()"""
+        struct.pack_into(self.slot_format, self.map, offset, *values)
+
+    def read(self, key):
+        """Значения слота ключа или None, если ключа нет в корзине"""
+        with self.bucket(key) as (key_hash, slots):
+            for _, values in slots:
+                if values[0] == key_hash:
+                    return values[1:]
+        return None
+
+    def write(self, key, *values):
+        """Запись в слот ключа, свободный слот или первый слот корзины"""
+        with self.bucket(key) as (key_hash, slots):
+            offset = next(
+                (offset for offset, stored in slots if stored[0] == key_hash),
+                next((offset for offset, stored in slots if stored[0] == 0), slots[0][0])
+            )
+            self.pack(offset, key_hash, *values)
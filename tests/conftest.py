@@ -0,0 +1,28 @@
+import os
+import pytest
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app', 'migration')
+
+
+@pytest.fixture
+def app_factory(tmp_path, monkeypatch):
+    """create_app с общей памятью во временном каталоге и заданными переменными окружения.
+
+    По умолчанию база - SQLite, миграции не применяются и схему создает тест.
+    """
+    def factory(migrate=False, **env):
+        monkeypatch.setenv('DATABASE_URL', env.pop('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}"))
+        monkeypatch.setenv('RATELIMIT_STORAGE_PATH', str(tmp_path / 'ratelimit'))
+        monkeypatch.setenv('REPLICA_PIN_STORAGE_PATH', str(tmp_path / 'pins'))
+        monkeypatch.setenv('LOG_FORMAT', 'text')
+        monkeypatch.setenv('LOG_LEVEL', 'CRITICAL')
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        if migrate:
+            # Migrator читает changelog.yaml и файлы миграций относительно
+            # рабочего каталога; миграции написаны для Postgres
+            monkeypatch.chdir(MIGRATIONS_DIR)
+
+        from app import create_app
+        return create_app()
+    return factory
@@ -0,0 +1,143 @@
+"""
+Тесты delta-кодирования аудита
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from app.audit import DELTA, FULL, covers, diff_values, encode_values, rebuild_states
+
+Entry = namedtuple('Entry', 'id action encoding old_values new_values created_at')
+
+CREATED = {'name': 'Netflix', 'amount': 9.99, 'periodicity': 'monthly'}
+
+
+def entry(entry_id, action, values):
+    old_values, new_values, encoding = values
+    return Entry(entry_id, action, encoding, old_values, new_values, datetime(2026, 1, entry_id))
+
+
+class TestDiffValues:
+    """Тесты для функции diff_values"""
+
+    def test_only_changed_fields(self):
+        """Тест: в delta попадают только изменившиеся поля"""
+        old, new = diff_values(
+            {'amount': 9.99, 'periodicity': 'monthly'},
+            {'amount': 12.99, 'periodicity': 'monthly'}
+        )
+        assert old == {'amount': 9.99}
+        assert new == {'amount': 12.99}
+
+    def test_added_and_removed_fields(self):
+        """Тест появления и исчезновения полей"""
+        old, new = diff_values({'a': 1}, {'b': 2})
+        assert old == {'a': 1}
+        assert new == {'b': 2}
+
+    def test_no_changes(self):
+        """Тест пустого diff"""
+        assert diff_values({'a': 1}, {'a': 1}) == ({}, {})
+        assert diff_values(None, None) == ({}, {})
+
+
+class TestEncodeValues:
+    """Тесты для функции encode_values"""
+
+    def test_full_encoding(self):
+        """Тест full-режима: значения не меняются"""
+        assert encode_values('UPDATE', {'a': 1}, {'a': 2}, FULL) == ({'a': 1}, {'a': 2}, FULL)
+
+    def test_create_is_always_full(self):
+        """Тест: CREATE хранит полное начальное состояние"""
+        assert encode_values('CREATE', None, CREATED, DELTA) == (None, CREATED, FULL)
+
+    def test_update_delta(self):
+        """Тест UPDATE в delta-режиме, если история восстанавливает неизменные поля"""
+        assert encode_values('UPDATE', {'a': 1, 'b': 2}, {'a': 1, 'b': 3}, DELTA, {'a': 1, 'b': 2}) == (
+            {'b': 2}, {'b': 3}, DELTA
+        )
+
+    def test_update_full_without_history(self):
+        """Тест UPDATE без истории: полный снимок сохраняется"""
+        assert encode_values('UPDATE', {'a': 1, 'b': 2}, {'a': 1, 'b': 3}, DELTA) == (
+            {'a': 1, 'b': 2}, {'a': 1, 'b': 3}, FULL
+        )
+
+    def test_update_full_when_history_lacks_field(self):
+        """Тест UPDATE после старого CREATE без next_billing_date"""
+        old = {**CREATED, 'next_billing_date': '2026-02-01'}
+        new = {**old, 'amount': 12.99}
+        assert encode_values('UPDATE', old, new, DELTA, CREATED) == (old, new, FULL)
+
+    def test_delete_delta_when_rebuildable(self):
+        """Тест DELETE: снимок заменяется деактивацией, если история его восстанавливает"""
+        state = {**CREATED, 'start_date': '2026-01-01'}
+        assert encode_values('DELETE', CREATED, None, DELTA, state) == (
+            {'is_active': True}, {'is_active': False}, DELTA
+        )
+
+    def test_delete_full_without_history(self):
+        """Тест DELETE без истории: полный снимок сохраняется"""
+        assert encode_values('DELETE', CREATED, None, DELTA) == (CREATED, None, FULL)
+        assert encode_values('DELETE', CREATED, None, DELTA, {}) == (CREATED, None, FULL)
+
+    def test_delete_full_when_history_differs(self):
+        """Тест DELETE, если история расходится со снимком"""
+        state = {**CREATED, 'amount': 5.0}
+        assert encode_values('DELETE', CREATED, None, DELTA, state) == (CREATED, None, FULL)
+
+
+class TestCovers:
+    """Тесты для функции covers"""
+
+    def test_missing_key_is_not_covered(self):
+        """Тест: отсутствующее в состоянии поле не восстанавливается, даже если оно None"""
+        assert not covers({}, {'description': None})
+        assert covers({'description': None}, {'description': None})
+
+
+class TestRebuildStates:
+    """Тесты для функции rebuild_states"""
+
+    def test_delta_history_matches_full_history(self):
+        """Тест: delta- и full-кодирование дают одинаковые полные состояния"""
+        updated = {**CREATED, 'amount': 12.99}
+        changes = [
+            ('CREATE', None, CREATED, None),
+            ('UPDATE', CREATED, updated, CREATED),
+            ('DELETE', updated, None, updated),
+        ]
+        histories = {}
+        for encoding in (FULL, DELTA):
+            entries = [
+                entry(index, action, encode_values(action, old, new, encoding, state))
+                for index, (action, old, new, state) in enumerate(changes, start=1)
+            ]
+            histories[encoding] = rebuild_states(entries)
+
+        for full, delta in zip(histories[FULL], histories[DELTA]):
+            for state in ('before', 'after'):
+                # delta-история дополнительно знает про is_active
+                restored = {key: value for key, value in (delta[state] or {}).items() if key != 'is_active'}
+                assert restored == (full[state] or {})
+
+    def test_states(self):
+        """Тест состояний до и после для каждой записи"""
+        entries = [
+            entry(1, 'CREATE', (None, CREATED, FULL)),
+            entry(2, 'UPDATE', ({'amount': 9.99}, {'amount': 12.99}, DELTA)),
+            entry(3, 'DELETE', ({'is_active': True}, {'is_active': False}, DELTA)),
+        ]
+        history = rebuild_states(entries)
+
+        assert history[0]['before'] is None
+        assert history[0]['after'] == CREATED
+        assert history[1]['before'] == CREATED
+        assert history[1]['after'] == {**CREATED, 'amount': 12.99}
+        assert history[2]['after'] == {**CREATED, 'amount': 12.99, 'is_active': False}
+        assert history[2]['created_at'] == '2026-01-03T00:00:00'
+
+    def test_legacy_delete_without_create(self):
+        """Тест строки без CREATE: полный снимок DELETE дает все поля"""
+        history = rebuild_states([entry(1, 'DELETE', (CREATED, None, FULL))])
+        assert history[0]['before'] == CREATED
@@ -0,0 +1,73 @@
+"""
+Тесты сборки COPY-запросов выгрузки
+"""
+
+from datetime import date, datetime, time
+import pytest
+from psycopg2 import sql
+from app.export import EXPORT_TABLES, build_copy_query, parse_date
+
+
+def parts(composed):
+    """Плоский список частей psycopg2.sql.Composed"""
+    result = []
+    for part in composed.seq if isinstance(composed, sql.Composed) else [composed]:
+        if isinstance(part, sql.Composed):
+            result.extend(parts(part))
+        else:
+            result.append(part)
+    return result
+
+
+class TestBuildCopyQuery:
+    """Тесты для функции build_copy_query"""
+
+    def test_unknown_table(self):
+        """Тест ошибки для таблицы, которой нет в EXPORT_TABLES"""
+        with pytest.raises(ValueError):
+            build_copy_query('users')
+
+    def test_columns(self):
+        """Тест: выгружаются колонки из EXPORT_TABLES, включая encoding аудита"""
+        query = parts(build_copy_query('audit_logs'))
+        identifiers = [part.string for part in query if isinstance(part, sql.Identifier)]
+        assert identifiers == list(EXPORT_TABLES['audit_logs'][0]) + ['audit_logs']
+        assert 'encoding' in identifiers
+
+    def test_no_filters(self):
+        """Тест запроса без фильтров"""
+        query = parts(build_copy_query('subscriptions'))
+        assert not any(isinstance(part, sql.Literal) for part in query)
+        assert sql.SQL(' WHERE ') not in query
+
+    def test_filters_are_literals(self):
+        """Тест: фильтры подставляются как Literal, а не строкой"""
+        query = parts(build_copy_query(
+            'subscriptions', user_id='42', date_from=date(2026, 1, 1), date_to=date(2026, 1, 31)
+        ))
+        literals = [part.wrapped for part in query if isinstance(part, sql.Literal)]
+        assert literals == [
+            42,
+            datetime(2026, 1, 1),
+            datetime.combine(date(2026, 1, 31), time.max),
+        ]
+
+    def test_header(self):
+        """Тест заголовка CSV только для первого шарда"""
+        assert sql.SQL('true') in parts(build_copy_query('subscriptions'))
+        assert sql.SQL('false') in parts(build_copy_query('subscriptions', header=False))
+
+
+class TestParseDate:
+    """Тесты для функции parse_date"""
+
+    def test_valid(self):
+        assert parse_date('2026-03-01') == date(2026, 3, 1)
+
+    def test_empty(self):
+        assert parse_date('') is None
+        assert parse_date(None) is None
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_date('01.03.2026')
@@ -0,0 +1,132 @@
+"""
+Тесты фильтров и обработчика логов
+"""
+
+import json
+import logging
+import queue
+import sys
+from app import logconfig
+from app.logconfig import (
+    JsonFormatter, NonBlockingQueueHandler, RateLimitFilter, SamplingFilter, parse_sampling
+)
+
+
+def make_record(name='app.routes', level=logging.ERROR, msg='Error creating subscription: %s', args=('db down',)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestRateLimitFilter:
+    """Тесты для RateLimitFilter"""
+
+    def test_burst(self):
+        """Тест: после burst одинаковых записей остальные подавляются"""
+        limit = RateLimitFilter(burst=3, period=60)
+        assert [limit.filter(make_record()) for _ in range(5)] == [True, True, True, False, False]
+
+    def test_same_template_different_errors(self):
+        """Тест: разные ошибки с общим шаблоном не подавляют друг друга"""
+        limit = RateLimitFilter(burst=2, period=60)
+        for _ in range(5):
+            limit.filter(make_record(args=('db down',)))
+        assert limit.filter(make_record(args=(KeyError('user_id'),)))
+
+    def test_suppressed_count_after_period(self, monkeypatch):
+        """Тест: число подавленных записей попадает в первую запись нового окна"""
+        now = [100.0]
+        monkeypatch.setattr(logconfig.time, 'monotonic', lambda: now[0])
+        limit = RateLimitFilter(burst=1, period=60)
+        for _ in range(4):
+            limit.filter(make_record())
+
+        now[0] += 61
+        record = make_record()
+        assert limit.filter(record)
+        assert record.suppressed == 3
+
+    def test_windows_are_bounded(self):
+        """Тест: уникальные сообщения не копятся без ограничения"""
+        limit = RateLimitFilter(burst=1, period=60, max_keys=50)
+        for index in range(500):
+            limit.filter(make_record(args=(index,)))
+        assert len(limit.windows) <= 50
+
+
+class TestSamplingFilter:
+    """Тесты для SamplingFilter"""
+
+    def test_rate_applies_to_children(self):
+        """Тест: правило логгера действует на потомков"""
+        sampling = SamplingFilter({'app': 0.5, 'app.routes': 0.1})
+        assert sampling.rate_for('app.routes.extra') == 0.1
+        assert sampling.rate_for('app.replicas') == 0.5
+        assert sampling.rate_for('werkzeug') == 1.0
+
+    def test_warnings_are_never_sampled(self):
+        """Тест: WARNING и выше пишутся всегда"""
+        sampling = SamplingFilter({'app.routes': 0.0})
+        assert sampling.filter(make_record(level=logging.WARNING))
+        assert not sampling.filter(make_record(level=logging.INFO))
+
+    def test_sampling_rate(self, monkeypatch):
+        """Тест доли сохраняемых записей"""
+        values = iter([0.05, 0.5])
+        monkeypatch.setattr(logconfig.random, 'random', lambda: next(values))
+        sampling = SamplingFilter({'app.routes': 0.1})
+        assert sampling.filter(make_record(level=logging.INFO))
+        assert not sampling.filter(make_record(level=logging.INFO))
+
+    def test_parse_sampling(self):
+        """Тест разбора LOG_SAMPLING"""
+        assert parse_sampling('app.routes=0.1, app.replicas=0.5') == {'app.routes': 0.1, 'app.replicas': 0.5}
+        assert parse_sampling('') == {}
+
+
+class TestNonBlockingQueueHandler:
+    """Тесты для NonBlockingQueueHandler"""
+
+    def test_message_is_formatted_on_enqueue(self):
+        """Тест: аргументы подставляются до постановки в очередь"""
+        handler = NonBlockingQueueHandler(queue.Queue())
+        handler.handle(make_record())
+        record = handler.queue.get_nowait()
+        assert record.msg == 'Error creating subscription: db down'
+        assert record.args is None
+
+    def test_dropped_records_are_reported(self):
+        """Тест: число отброшенных записей попадает в следующую запись и статистику"""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        for index in range(4):
+            handler.handle(make_record(args=(index,)))
+        handler.queue.get_nowait()
+
+        handler.handle(make_record(args=('next',)))
+        record = handler.queue.get_nowait()
+        assert record.dropped == 3
+        assert json.loads(JsonFormatter().format(record))['dropped'] == 3
+        assert handler.stats() == {'queued': 0, 'capacity': 1, 'dropped': 3}
+
+        handler.handle(make_record(args=('after',)))
+        assert not getattr(handler.queue.get_nowait(), 'dropped', None)
+
+
+class TestJsonFormatter:
+    """Тесты для JsonFormatter"""
+
+    def test_fields(self):
+        """Тест полей JSON-записи"""
+        record = make_record()
+        record.request_id = 'abc'
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry['level'] == 'ERROR'
+        assert entry['logger'] == 'app.routes'
+        assert entry['message'] == 'Error creating subscription: db down'
+        assert entry['request_id'] == 'abc'
+
+    def test_exception(self):
+        """Тест traceback в поле exc"""
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = logging.LogRecord('app', logging.ERROR, __file__, 1, 'failed', None, sys.exc_info())
+        assert 'ValueError: boom' in json.loads(JsonFormatter().format(record))['exc']
@@ -0,0 +1,161 @@
+"""
+Интеграционные тесты на локальных Postgres.
+
+Запускаются, только если заданы переменные окружения:
+    TEST_DATABASE_URL - основная база (shard_directory);
+    TEST_SHARD_DATABASE_URLS - минимум две базы шардов через запятую;
+    TEST_REPLICA_DATABASE_URLS - реплики через запятую (по умолчанию основная база).
+"""
+
+import os
+import uuid
+import pytest
+from sqlalchemy import text
+
+DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+SHARD_URLS = [url for url in os.environ.get('TEST_SHARD_DATABASE_URLS', '').split(',') if url]
+REPLICA_URLS = os.environ.get('TEST_REPLICA_DATABASE_URLS') or DATABASE_URL
+
+requires_postgres = pytest.mark.skipif(not DATABASE_URL, reason='TEST_DATABASE_URL не задан')
+requires_shards = pytest.mark.skipif(
+    not DATABASE_URL or len(SHARD_URLS) < 2,
+    reason='TEST_DATABASE_URL и минимум два TEST_SHARD_DATABASE_URLS не заданы'
+)
+
+
+@requires_postgres
+class TestReplicaHealth:
+    """Тесты проверки реплик"""
+
+    def test_replicas_in_rotation(self, app_factory):
+        """Тест: работающие реплики (или сама основная база) попадают в ротацию"""
+        app = app_factory(migrate=True, DATABASE_URL=DATABASE_URL, DATABASE_REPLICA_URLS=REPLICA_URLS)
+        from app import replica_router
+
+        with app.app_context():
+            healthy = replica_router.check_replicas()
+        assert healthy == replica_router.replicas
+        assert all(lag is not None and lag <= replica_router.max_lag for lag in replica_router.lag.values())
+
+        response = app.test_client().get('/replicas/stats')
+        assert response.get_json()['healthy'] == healthy
+
+
+@requires_shards
+class TestShardMove:
+    """Тесты онлайн-переноса пользователя между шардами"""
+
+    @pytest.fixture
+    def sharded_app(self, app_factory):
+        return app_factory(
+            migrate=True,
+            DATABASE_URL=DATABASE_URL,
+            SHARD_DATABASE_URLS=','.join(SHARD_URLS),
+            SHARD_DIRECTORY_CACHE_TTL='3600'
+        )
+
+    @pytest.fixture
+    def user_id(self, sharded_app):
+        from app import db, shard_router
+
+        user_id = 10 ** 8 + uuid.uuid4().int % 10 ** 8
+        name = f'test-{user_id}'
+        with sharded_app.app_context():
+            home = shard_router.shard_for_user(user_id)
+            with db.engines[home].begin() as connection:
+                connection.execute(
+                    text('INSERT INTO users (id, username, email) VALUES (:id, :name, :email)'),
+                    {'id': user_id, 'name': name, 'email': f'{name}@example.com'}
+                )
+        yield user_id
+
+        with sharded_app.app_context():
+            for key in shard_router.shards:
+                with db.engines[key].begin() as connection:
+                    for table, column in (('audit_logs', 'user_id'), ('subscriptions', 'user_id'),
+                                          ('users', 'id'), ('shard_forwarding', 'user_id')):
+                        connection.execute(text(f'DELETE FROM {table} WHERE {column} = :id'), {'id': user_id})
+            with db.engine.begin() as connection:
+                connection.execute(text('DELETE FROM shard_directory WHERE user_id = :id'), {'id': user_id})
+
+    def test_stale_cache_after_move(self, sharded_app, user_id):
+        """Тест: процесс с устаревшим кэшем после переноса читает строки с нового шарда"""
+        from app import db, shard_router
+        from app.sharding import ShardRebalancer
+
+        client = sharded_app.test_client()
+        response = client.post('/subscriptions', json={
+            'user_id': user_id, 'name': 'Netflix', 'amount': 9.99,
+            'periodicity': 'monthly', 'start_date': '2026-01-01'
+        })
+        assert response.status_code == 201
+
+        with sharded_app.app_context():
+            source = shard_router.shard_for_user(user_id)
+            target = (shard_router.shards.index(source) + 1) % len(shard_router.shards)
+            assert ShardRebalancer(db, shard_router).move_user(user_id, target) == 3
+
+        # Кэш другого воркера: пользователь все еще на исходном шарде
+        shard_router.cache_directory(user_id, shard_router.shards.index(source))
+
+        subscriptions = client.get(f'/users/{user_id}/subscriptions').get_json()['subscriptions']
+        assert [subscription['name'] for subscription in subscriptions] == ['Netflix']
+
+        shard_router.cache_directory(user_id, shard_router.shards.index(source))
+        response = client.post('/users/subscriptions:batchGet', json={'user_ids': [user_id]})
+        assert len(response.get_json()['users'][str(user_id)]['subscriptions']) == 1
+
+        response = client.post('/subscriptions', json={
+            'user_id': user_id, 'name': 'Spotify', 'amount': 4.99,
+            'periodicity': 'monthly', 'start_date': '2026-01-01'
+        })
+        assert response.status_code == 201
+
+    def test_invalid_user_id(self, sharded_app):
+        """Тест: нечисловой user_id в теле запроса - 400, а не 500"""
+        response = sharded_app.test_client().post('/subscriptions', json={'user_id': 'abc'})
+        assert response.status_code == 400
+
+
+@requires_postgres
+class TestPrefixSearch:
+    """Тесты префиксного поиска на Postgres"""
+
+    def test_prefix_pages(self, app_factory):
+        """Тест: префиксный поиск без учета регистра с пагинацией по курсору"""
+        app = app_factory(migrate=True, DATABASE_URL=DATABASE_URL)
+        from app import db
+
+        user_id = 10 ** 8 + uuid.uuid4().int % 10 ** 8
+        names = ['Netflix', 'netflix kids', 'NETFLIX 4K', 'Spotify']
+        with app.app_context():
+            db.session.execute(
+                text('INSERT INTO users (id, username, email) VALUES (:id, :name, :email)'),
+                {'id': user_id, 'name': f'test-{user_id}', 'email': f'test-{user_id}@example.com'}
+            )
+            for name in names:
+                db.session.execute(text('''
+                    INSERT INTO subscriptions (user_id, name, amount, periodicity, start_date, next_billing_date)
+                    VALUES (:user_id, :name, 1, 'monthly', '2026-01-01', '2026-01-01')
+                '''), {'user_id': user_id, 'name': name})
+            db.session.commit()
+
+        try:
+            client = app.test_client()
+            found = []
+            cursor = None
+            while True:
+                query = {'q': 'ne', 'user_id': user_id, 'limit': 2}
+                if cursor:
+                    query['cursor'] = cursor
+                body = client.get('/subscriptions/search', query_string=query).get_json()
+                found.extend(subscription['name'] for subscription in body['subscriptions'])
+                cursor = body['next_cursor']
+                if not cursor:
+                    break
+            assert found == sorted(names[:3], key=str.lower)
+        finally:
+            with app.app_context():
+                db.session.execute(text('DELETE FROM subscriptions WHERE user_id = :id'), {'id': user_id})
+                db.session.execute(text('DELETE FROM users WHERE id = :id'), {'id': user_id})
+                db.session.commit()
@@ -0,0 +1,182 @@
+"""
+Тесты token bucket лимитера
+"""
+
+import pytest
+from flask import Flask
+from app import ratelimit
+from app.ratelimit import SharedBucketStore, RateLimiter
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit.time, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedBucketStore(str(tmp_path / 'buckets'), slots=64)
+
+
+def same_bucket(store, monkeypatch):
+    """Все ключи попадают в одну корзину из SLOT_WAYS слотов"""
+    key_hash = store.table.key_hash
+    buckets = store.table.buckets
+    monkeypatch.setattr(store.table, 'key_hash', lambda key: key_hash(key) // buckets * buckets + 1)
+
+
+class TestSharedBucketStore:
+    """Тесты для SharedBucketStore.consume"""
+
+    def test_burst_then_limited(self, store, clock):
+        """Тест исчерпания корзины: burst запросов проходят, следующий - нет"""
+        results = [store.consume('ip:1.2.3.4:read', rate=1, burst=5)[0] for _ in range(6)]
+        assert results == [True] * 5 + [False]
+
+    def test_retry_after(self, store, clock):
+        """Тест времени ожидания до следующего токена"""
+        for _ in range(2):
+            store.consume('key', rate=0.5, burst=2)
+        allowed, retry_after = store.consume('key', rate=0.5, burst=2)
+        assert not allowed
+        assert retry_after == pytest.approx(2.0)
+
+    def test_refill(self, store, clock):
+        """Тест пополнения токенов со временем, но не больше burst"""
+        for _ in range(3):
+            store.consume('key', rate=1, burst=3)
+        clock.now += 2
+        results = [store.consume('key', rate=1, burst=3)[0] for _ in range(3)]
+        assert results == [True, True, False]
+
+        clock.now += 100
+        results = [store.consume('key', rate=1, burst=3)[0] for _ in range(4)]
+        assert results == [True, True, True, False]
+
+    def test_keys_are_independent(self, store, clock):
+        """Тест независимых корзин для разных ключей"""
+        for _ in range(2):
+            store.consume('user:1:read', rate=1, burst=2)
+        assert not store.consume('user:1:read', rate=1, burst=2)[0]
+        assert store.consume('user:2:read', rate=1, burst=2)[0]
+
+    def test_collision_never_refills(self, store, clock, monkeypatch):
+        """Тест коллизии: ключи одной корзины не выдают исчерпанному ключу новый burst"""
+        same_bucket(store, monkeypatch)
+
+        for _ in range(5):
+            store.consume('ip:203.0.113.7:read', rate=1, burst=5)
+        for user_id in range(50):
+            store.consume(f'user:{user_id}:read', rate=1, burst=5)
+
+        results = [store.consume('ip:203.0.113.7:read', rate=1, burst=5)[0] for _ in range(100)]
+        assert not any(results)
+
+    def test_refilled_slot_is_reused(self, store, clock, monkeypatch):
+        """Тест вытеснения: полностью пополненный слот отдается другому ключу"""
+        same_bucket(store, monkeypatch)
+
+        for user_id in range(ratelimit.SLOT_WAYS):
+            store.consume(f'user:{user_id}:read', rate=1, burst=5)
+        clock.now += 10
+        assert [store.consume('user:new:read', rate=1, burst=5)[0] for _ in range(5)] == [True] * 5
+
+    def test_hash_is_keyed_per_file(self, tmp_path):
+        """Тест секрета узла: общий для открывших файл процессов, разный для узлов"""
+        first = SharedBucketStore(str(tmp_path / 'a'), slots=64)
+        same_node = SharedBucketStore(str(tmp_path / 'a'), slots=64)
+        other_node = SharedBucketStore(str(tmp_path / 'b'), slots=64)
+
+        assert first.table.key_hash('ip:1:read') == same_node.table.key_hash('ip:1:read')
+        assert first.table.key_hash('ip:1:read') != other_node.table.key_hash('ip:1:read')
+
+    def test_stats(self, store):
+        """Тест счетчиков статистики"""
+        store.record('read', True)
+        store.record('read', True)
+        store.record('write', False)
+        assert store.stats() == {
+            'read_allowed': 2, 'read_limited': 0, 'write_allowed': 0, 'write_limited': 1
+        }
+
+
+class TestRateLimiterConfig:
+    """Тесты проверки настроек RateLimiter"""
+
+    @staticmethod
+    def make_app(tmp_path, **overrides):
+        app = Flask(__name__)
+        app.config.update(
+            RATELIMIT_ENABLED=True,
+            RATELIMIT_STORAGE_PATH=str(tmp_path / 'ratelimit'),
+            RATELIMIT_TRUST_X_REAL_IP=True,
+            RATELIMIT_READ_RATE=20.0, RATELIMIT_READ_BURST=100.0,
+            RATELIMIT_WRITE_RATE=2.0, RATELIMIT_WRITE_BURST=20.0,
+            RATELIMIT_GLOBAL_READ_RATE=0.0, RATELIMIT_GLOBAL_READ_BURST=0.0,
+            RATELIMIT_GLOBAL_WRITE_RATE=200.0, RATELIMIT_GLOBAL_WRITE_BURST=400.0,
+        )
+        app.config.update(overrides)
+        return app
+
+    def test_valid_config(self, tmp_path):
+        """Тест корректных настроек: глобальный лимит 0 отключен"""
+        limiter = RateLimiter(self.make_app(tmp_path))
+        assert limiter.store is not None
+
+    @pytest.mark.parametrize('overrides', [
+        {'RATELIMIT_READ_RATE': 0.0},
+        {'RATELIMIT_WRITE_RATE': -1.0},
+        {'RATELIMIT_READ_BURST': 0.0},
+        {'RATELIMIT_GLOBAL_WRITE_RATE': -5.0},
+        {'RATELIMIT_GLOBAL_READ_RATE': 10.0, 'RATELIMIT_GLOBAL_READ_BURST': 0.0},
+    ])
+    def test_invalid_config(self, tmp_path, overrides):
+        """Тест ошибки при нулевом или отрицательном rate и пустом burst"""
+        with pytest.raises(ValueError):
+            RateLimiter(self.make_app(tmp_path, **overrides))
+
+
+class TestRateLimiterCheck:
+    """Тесты RateLimiter.check на запросах Flask"""
+
+    @staticmethod
+    def make_client(tmp_path, **overrides):
+        app = TestRateLimiterConfig.make_app(tmp_path, **overrides)
+        limiter = RateLimiter(app)
+        app.before_request(limiter.check)
+        app.add_url_rule('/items/<int:item_id>', 'update', lambda item_id: 'ok', methods=['PUT'])
+        return app.test_client()
+
+    def test_check_does_not_charge(self, store, clock):
+        """Тест: проверка без списания не меняет корзину"""
+        for _ in range(3):
+            assert store.consume('key', rate=1, burst=3, charge=False)[0]
+        assert [store.consume('key', rate=1, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+
+    def test_limited_client_does_not_drain_global_budget(self, tmp_path, clock):
+        """Тест: клиент сверх своего лимита не тратит общий бюджет узла"""
+        client = self.make_client(
+            tmp_path,
+            RATELIMIT_WRITE_RATE=0.001, RATELIMIT_WRITE_BURST=5.0,
+            RATELIMIT_GLOBAL_WRITE_RATE=0.001, RATELIMIT_GLOBAL_WRITE_BURST=50.0
+        )
+        statuses = [
+            client.put('/items/1', headers={'X-Real-IP': '203.0.113.7'}).status_code
+            for _ in range(60)
+        ]
+        assert statuses.count(200) == 5
+        assert statuses.count(429) == 55
+        assert 'Retry-After' in client.put('/items/1', headers={'X-Real-IP': '203.0.113.7'}).headers
+
+        response = client.put('/items/1', headers={'X-Real-IP': '198.51.100.1'})
+        assert response.status_code == 200
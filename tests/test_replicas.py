@@ -0,0 +1,165 @@
+"""
+Тесты оценки отставания реплик и закрепления чтений за primary
+"""
+
+from collections import namedtuple
+import pytest
+from flask import Flask, g
+from app import replicas
+from app.replicas import ReplicaRouter, replica_lag
+from app.sharedmem import SharedSlotTable
+
+
+class TestReplicaLag:
+    """Тесты для функции replica_lag"""
+
+    def test_primary(self):
+        """Тест: сервер не в режиме восстановления считается свежим"""
+        assert replica_lag(False, None, False, None, None) == 0.0
+
+    def test_caught_up_without_stream(self):
+        """Тест: реплика, применившая WAL primary, свежая даже без потока"""
+        assert replica_lag(True, 0, False, True, 600.0) == 0.0
+        assert replica_lag(True, -128, False, True, 600.0) == 0.0
+
+    def test_stalled_receiver(self):
+        """Тест: receive = replay при остановленном WAL receiver - не признак свежести"""
+        assert replica_lag(True, 4096, False, True, 600.0) is None
+
+    def test_receive_behind_primary(self):
+        """Тест: поток работает, все полученное применено, но получено не все с primary"""
+        assert replica_lag(True, 4096, True, True, 12.5) == 12.5
+        assert replica_lag(True, 4096, True, True, None) is None
+
+    def test_primary_lsn_unknown(self):
+        """Тест: без LSN primary решает состояние WAL receiver"""
+        assert replica_lag(True, None, False, True, 1.0) is None
+        assert replica_lag(True, None, True, True, 600.0) == 0.0
+        assert replica_lag(True, None, True, False, 3.0) == 3.0
+
+    def test_streaming_behind(self):
+        """Тест: отставание по возрасту последней примененной транзакции"""
+        assert replica_lag(True, 4096, True, False, 12.5) == 12.5
+
+
+LagRow = namedtuple('LagRow', 'in_recovery behind_bytes streaming replayed replay_age')
+
+
+class FakeConnection:
+    def __init__(self, row):
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        return self
+
+    def scalar(self):
+        return self.row
+
+    def one(self):
+        return self.row
+
+
+class FakeEngine:
+    def __init__(self, row):
+        self.row = row
+
+    def connect(self):
+        return FakeConnection(self.row)
+
+
+class TestCheckReplicas:
+    """Тесты для ReplicaRouter.check_replicas"""
+
+    def test_byte_lag_excludes_replica(self):
+        """Тест: реплика, отставшая по WAL больше лимита, исключается даже при свежей транзакции"""
+        router = ReplicaRouter()
+        router.replicas = ['replica_0', 'replica_1', 'replica_2']
+        router.max_lag = 5
+        router.max_lag_bytes = 1024
+        router.db = type('Db', (), {
+            'engine': FakeEngine('0/3000000'),
+            'engines': {
+                'replica_0': FakeEngine(LagRow(True, 0, True, True, 600.0)),
+                'replica_1': FakeEngine(LagRow(True, 512, True, True, 0.5)),
+                'replica_2': FakeEngine(LagRow(True, 4096, True, True, 0.5)),
+            },
+        })()
+
+        assert router.check_replicas() == ['replica_0', 'replica_1']
+        assert router.lag_bytes == {'replica_0': 0, 'replica_1': 512, 'replica_2': 4096}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(replicas.time, 'time', fake)
+    return fake
+
+
+def make_router(tmp_path, slots):
+    router = ReplicaRouter()
+    router.window = 5
+    router.pins = SharedSlotTable(str(tmp_path / 'pins'), 'Qd', slots=slots)
+    return router
+
+
+class TestReadYourWrites:
+    """Тесты закрепления чтений пользователя за primary"""
+
+    def test_pin_expires(self, tmp_path, clock):
+        """Тест: после записи чтения идут на primary в течение окна"""
+        router = make_router(tmp_path, slots=1024)
+        assert not router.is_pinned(1)
+        router.mark_write(1)
+        assert router.is_pinned(1)
+        clock.now += 6
+        assert not router.is_pinned(1)
+
+    def test_anonymous_reads(self, tmp_path, clock):
+        """Тест: запрос без пользователя не закреплен"""
+        assert not make_router(tmp_path, slots=1024).is_pinned(None)
+
+    def test_evicted_pin_routes_to_primary(self, tmp_path, clock):
+        """Тест коллизии: вытесненная метка не превращается в чтение с реплики"""
+        router = make_router(tmp_path, slots=1)
+        router.mark_write(1)
+        clock.now += 1
+        router.mark_write(2)
+        assert router.is_pinned(1)
+        clock.now += 5
+        assert not router.is_pinned(1)
+
+    def test_route_read(self, tmp_path, clock, monkeypatch):
+        """Тест: пакетное чтение идет на primary, если закреплен хотя бы один пользователь"""
+        router = make_router(tmp_path, slots=1024)
+        router.healthy = ['replica_0']
+        monkeypatch.setattr(replicas, 'g', type('G', (), {})())
+        router.mark_write(3)
+        assert router.route_read([1, 2, 3]) is None
+        assert router.route_read([1, 2]) == 'replica_0'
+
+    def test_query_string_user_is_pinned(self, tmp_path, clock):
+        """Тест: user_id из строки запроса (поиск, выгрузка) учитывается при закреплении"""
+        router = make_router(tmp_path, slots=1024)
+        router.healthy = ['replica_0']
+        router.mark_write(3)
+        app = Flask(__name__)
+
+        for user_id, replica in (('3', None), ('03', None), ('4', 'replica_0'), ('abc', None)):
+            with app.test_request_context('/subscriptions/search', query_string={'q': 'x', 'user_id': user_id}):
+                router.route_request()
+                assert g.get('db_replica') == replica
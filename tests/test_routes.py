@@ -0,0 +1,193 @@
+"""
+Тесты API на SQLite: проверка входных данных и мягкое удаление
+"""
+
+from datetime import date
+import pytest
+from app import db
+from app.models import AuditLog, Subscription, User
+from app.search import encode_cursor
+
+
+@pytest.fixture
+def app(app_factory):
+    app = app_factory()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='user', email='user@example.com'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_subscription(client, **overrides):
+    data = {'user_id': 1, 'name': 'Netflix', 'amount': 9.99, 'periodicity': 'monthly',
+            'start_date': '2026-01-01'}
+    data.update(overrides)
+    response = client.post('/subscriptions', json=data)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+class TestSoftDelete:
+    """Тесты мягкого удаления подписок"""
+
+    def test_delete_hides_subscription(self, client):
+        """Тест: удаленная подписка не возвращается, повторное удаление - 404"""
+        subscription_id = create_subscription(client)
+        assert client.delete(f'/subscriptions/{subscription_id}').status_code == 200
+
+        response = client.get('/users/1/subscriptions')
+        assert response.get_json() == {'subscriptions': []}
+        assert client.delete(f'/subscriptions/{subscription_id}').status_code == 404
+
+    def test_update_deleted_subscription(self, app, client):
+        """Тест: PUT удаленной подписки возвращает 404 и не пишет аудит"""
+        subscription_id = create_subscription(client)
+        client.delete(f'/subscriptions/{subscription_id}')
+
+        response = client.put(f'/subscriptions/{subscription_id}', json={'amount': 1})
+        assert response.status_code == 404
+        with app.app_context():
+            actions = [entry.action for entry in AuditLog.query.order_by(AuditLog.id)]
+            assert actions == ['CREATE', 'DELETE']
+            assert float(db.session.get(Subscription, subscription_id).amount) == 9.99
+
+    def test_update_missing_subscription(self, client):
+        assert client.put('/subscriptions/999', json={'amount': 1}).status_code == 404
+
+
+class TestDeleteAudit:
+    """Тесты записи DELETE в аудит"""
+
+    def test_delete_with_history_is_delta(self, client):
+        """Тест: при полной истории DELETE хранит только деактивацию"""
+        subscription_id = create_subscription(client)
+        client.put(f'/subscriptions/{subscription_id}', json={'amount': 12.99})
+        client.delete(f'/subscriptions/{subscription_id}')
+
+        history = client.get(f'/subscriptions/{subscription_id}/audit').get_json()['history']
+        assert [entry['encoding'] for entry in history] == ['full', 'delta', 'delta']
+        assert history[-1]['before']['name'] == 'Netflix'
+        assert history[-1]['before']['amount'] == 12.99
+        assert history[-1]['after']['is_active'] is False
+
+    def test_delete_without_history_keeps_snapshot(self, app, client):
+        """Тест: для подписки без CREATE в аудите DELETE хранит полный снимок"""
+        with app.app_context():
+            db.session.add(Subscription(
+                id=50, user_id=1, name='Legacy', amount=5, periodicity='monthly',
+                start_date=date(2025, 1, 1), next_billing_date=date(2025, 1, 1)
+            ))
+            db.session.commit()
+
+        client.delete('/subscriptions/50')
+        history = client.get('/subscriptions/50/audit').get_json()['history']
+        assert history[0]['encoding'] == 'full'
+        assert history[0]['before'] == {'name': 'Legacy', 'amount': 5.0, 'periodicity': 'monthly'}
+
+    def test_update_without_history_keeps_snapshot(self, app, client):
+        """Тест: для подписки без CREATE в аудите UPDATE хранит полный снимок"""
+        with app.app_context():
+            db.session.add(Subscription(
+                id=51, user_id=1, name='Legacy', amount=5, periodicity='monthly',
+                start_date=date(2025, 1, 1), next_billing_date=date(2025, 1, 1)
+            ))
+            db.session.commit()
+
+        client.put('/subscriptions/51', json={'amount': 7})
+        history = client.get('/subscriptions/51/audit').get_json()['history']
+        assert history[0]['encoding'] == 'full'
+        assert history[0]['before']['next_billing_date'] == '2025-01-01'
+        assert history[0]['after'] == {'amount': 7.0, 'periodicity': 'monthly', 'next_billing_date': '2025-01-01'}
+
+
+class TestSearchValidation:
+    """Тесты проверки параметров GET /subscriptions/search"""
+
+    def test_missing_query(self, client):
+        assert client.get('/subscriptions/search').status_code == 400
+
+    @pytest.mark.parametrize('cursor', [
+        'garbage',
+        encode_cursor('similar', [[1], 2]),
+        encode_cursor('prefix', ['netflix', 2]),
+    ])
+    def test_invalid_cursor(self, client, cursor):
+        """Тест ответа 400 для поврежденного курсора или курсора другого режима"""
+        response = client.get('/subscriptions/search', query_string={'q': 'netflix', 'cursor': cursor})
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize('user_id', ['abc', '', '1.5'])
+    def test_invalid_user_id(self, client, user_id):
+        """Тест: нечисловой user_id - 400, а не поиск по всем пользователям"""
+        response = client.get('/subscriptions/search', query_string={'q': 'netflix', 'user_id': user_id})
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'user_id must be an integer'}
+
+
+class TestExportValidation:
+    """Тесты проверки параметров GET /exports/<table>"""
+
+    @pytest.mark.parametrize('query', [
+        {'user_id': 'abc'},
+        {'user_id': ''},
+        {'date_from': '2026-13-01'},
+    ])
+    def test_invalid_filters(self, client, query):
+        """Тест: некорректный фильтр - 400, а не выгрузка всей таблицы"""
+        assert client.get('/exports/subscriptions', query_string=query).status_code == 400
+
+
+class TestBatchGetValidation:
+    """Тесты проверки тела POST /users/subscriptions:batchGet"""
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'user_ids': []},
+        {'user_ids': 1},
+        {'user_ids': ['1']},
+        {'user_ids': [True]},
+        {'user_ids': [1.5]},
+        {'user_ids': list(range(501))},
+        {'user_ids': [1], 'limit': 0},
+        {'user_ids': [1], 'limit': 1001},
+        {'user_ids': [1], 'limit': '10'},
+        {'user_ids': [1], 'limit': True},
+    ])
+    def test_invalid_body(self, client, body):
+        """Тест ответа 400 для некорректного запроса"""
+        response = client.post('/users/subscriptions:batchGet', json=body)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+class TestOwnerWriteLimit:
+    """Тесты лимита записей владельца подписки"""
+
+    def test_put_is_charged_to_owner(self, app_factory):
+        """Тест: PUT без user_id в запросе списывает бюджет владельца подписки"""
+        app = app_factory(RATELIMIT_WRITE_RATE='0.001', RATELIMIT_WRITE_BURST='3')
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, username='user', email='user@example.com'))
+            db.session.commit()
+        client = app.test_client()
+
+        # Каждый запрос с нового IP: срабатывает только лимит пользователя
+        subscription_id = create_subscription(client)
+        statuses = [
+            client.put(f'/subscriptions/{subscription_id}', json={'amount': amount},
+                       headers={'X-Real-IP': f'198.51.100.{amount}'}).status_code
+            for amount in range(1, 4)
+        ]
+        assert statuses == [200, 200, 429]
+        response = client.delete(f'/subscriptions/{subscription_id}', headers={'X-Real-IP': '198.51.100.9'})
+        assert response.status_code == 429
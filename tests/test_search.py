@@ -0,0 +1,63 @@
+"""
+Тесты курсоров и экранирования поиска
+"""
+
+import base64
+import json
+import pytest
+from app.search import decode_cursor, encode_cursor, escape_like
+
+
+def raw_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+class TestCursor:
+    """Тесты для encode_cursor и decode_cursor"""
+
+    def test_round_trip(self):
+        """Тест: курсор восстанавливает ключ последней строки"""
+        assert decode_cursor(encode_cursor('prefix', ['netflix', 5]), 'prefix') == ['netflix', 5]
+        assert decode_cursor(encode_cursor('similar', [1.25, 7]), 'similar') == [1.25, 7]
+        assert decode_cursor(encode_cursor('similar', [1, 7]), 'similar') == [1, 7]
+
+    def test_mode_mismatch(self):
+        """Тест: курсор одного режима не подходит другому"""
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor('prefix', ['netflix', 5]), 'similar')
+
+    @pytest.mark.parametrize('cursor', [
+        'not base64!',
+        base64.urlsafe_b64encode(b'not json').decode(),
+        raw_cursor([1, 2]),
+        raw_cursor({'m': 'similar'}),
+        raw_cursor({'m': 'similar', 'k': 'ab'}),
+        raw_cursor({'m': 'similar', 'k': [1, 2, 3]}),
+        raw_cursor({'m': 'similar', 'k': [[1], 2]}),
+        raw_cursor({'m': 'similar', 'k': ['0.5', 2]}),
+        raw_cursor({'m': 'similar', 'k': [True, 2]}),
+        raw_cursor({'m': 'similar', 'k': [0.5, '2']}),
+        raw_cursor({'m': 'similar', 'k': [0.5, 2.5]}),
+        raw_cursor({'m': 'similar', 'k': [0.5, False]}),
+    ])
+    def test_invalid_similar_cursor(self, cursor):
+        """Тест ValueError для поврежденных курсоров"""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, 'similar')
+
+    @pytest.mark.parametrize('key', [[1, 2], [None, 2], [['a'], 2], ['a', None]])
+    def test_invalid_prefix_cursor(self, key):
+        """Тест ValueError для ключа префиксного курсора неверного типа"""
+        with pytest.raises(ValueError):
+            decode_cursor(raw_cursor({'m': 'prefix', 'k': key}), 'prefix')
+
+
+class TestEscapeLike:
+    """Тесты для функции escape_like"""
+
+    def test_wildcards(self):
+        """Тест экранирования спецсимволов LIKE"""
+        assert escape_like('50%_off\\') == '50\\%\\_off\\\\'
+
+    def test_plain(self):
+        assert escape_like('netflix') == 'netflix'
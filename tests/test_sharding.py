@@ -0,0 +1,201 @@
+"""
+Тесты распределения пользователей по шардам
+"""
+
+import hashlib
+import pytest
+from flask import Flask
+from app.sharding import SHARD_BUCKETS_PER_SHARD, ShardRouter
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows[0][1] if self.rows else None
+
+
+class FakeEngine:
+    """Таблица user_id -> shard, отвечающая на запросы shard_directory/shard_forwarding"""
+
+    def __init__(self, table=None):
+        self.table = table or {}
+        self.queries = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params):
+        self.queries += 1
+        user_ids = params['user_ids'] if 'user_ids' in params else [params['user_id']]
+        return FakeResult([(user_id, self.table[user_id]) for user_id in user_ids if user_id in self.table])
+
+
+class FakeDb:
+    def __init__(self, shards):
+        self.engine = FakeEngine()
+        self.engines = {key: FakeEngine() for key in shards}
+
+
+def initial_buckets(shards):
+    """Карта корзин, которую load_buckets создает при первом запуске"""
+    return [(bucket, bucket % shards) for bucket in range(shards * SHARD_BUCKETS_PER_SHARD)]
+
+
+@pytest.fixture
+def router():
+    router = ShardRouter()
+    router.shards = ['shard_0', 'shard_1', 'shard_2']
+    router.db = FakeDb(router.shards)
+    router.set_buckets(initial_buckets(3))
+    router.cache_ttl = 60
+    router.cache_size = 1000
+    return router
+
+
+def move(router, user_id, target):
+    """Перенос, выполненный другим процессом: shard_directory и метка на исходном шарде"""
+    source = router.shard_for_user(user_id, use_cache=False)
+    router.db.engine.table[user_id] = target
+    router.db.engines[source].table[user_id] = target
+    router.db.engines[router.shards[target]].table.pop(user_id, None)
+    return source
+
+
+class TestParseUserId:
+    """Тесты для ShardRouter.parse_user_id"""
+
+    def test_valid(self):
+        assert ShardRouter.parse_user_id(7) == 7
+        assert ShardRouter.parse_user_id('7') == 7
+
+    @pytest.mark.parametrize('value', ['abc', True, 1.5, None, [1], {'id': 1}])
+    def test_invalid(self, value):
+        """Тест ValueError для нечисловых user_id из JSON"""
+        with pytest.raises(ValueError):
+            ShardRouter.parse_user_id(value)
+
+
+class TestRouteRequest:
+    """Тесты для ShardRouter.route_request"""
+
+    def test_invalid_query_user_id(self, router):
+        """Тест: нечисловой user_id в строке запроса - 400, а не все шарды"""
+        with Flask(__name__).test_request_context('/exports/subscriptions', query_string={'user_id': 'abc'}):
+            response, status = router.route_request()
+        assert status == 400
+        assert response.get_json() == {'error': 'user_id must be an integer'}
+
+
+class TestBuckets:
+    """Тесты карты виртуальных корзин"""
+
+    def test_initial_map_keeps_modulo_placement(self, router):
+        """Тест: первая карта размещает пользователей как прежний хэш по модулю числа шардов"""
+        for user_id in range(300):
+            digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+            assert router.hash_shard(user_id) == int.from_bytes(digest, 'little') % 3
+
+    def test_new_shard_keeps_placement(self, router):
+        """Тест: новый шард без корзин не перемещает пользователей"""
+        before = [router.hash_shard(user_id) for user_id in range(1000)]
+        router.shards.append('shard_3')
+        router.set_buckets(initial_buckets(3))
+        assert [router.hash_shard(user_id) for user_id in range(1000)] == before
+
+    def test_missing_shard(self, router):
+        """Тест: карта с шардом, которого нет в конфигурации, останавливает запуск"""
+        router.shards.pop()
+        with pytest.raises(RuntimeError):
+            router.set_buckets(initial_buckets(3))
+
+    @pytest.mark.parametrize('rows', [[], [(0, 0), (2, 1)], [(1, 0)]])
+    def test_broken_map(self, router, rows):
+        with pytest.raises(RuntimeError):
+            router.set_buckets(rows)
+
+
+class TestShardForUser:
+    """Тесты для ShardRouter.shard_for_user"""
+
+    def test_hash_is_stable(self, router):
+        """Тест: хэш-распределение не зависит от процесса"""
+        assert router.hash_shard(7) == router.hash_shard('7')
+        assert {router.hash_shard(user_id) for user_id in range(300)} == {0, 1, 2}
+
+    def test_directory_override(self, router):
+        """Тест: shard_directory перекрывает хэш"""
+        target = (router.hash_shard(7) + 1) % 3
+        router.db.engine.table[7] = target
+        assert router.shard_for_user(7) == router.shards[target]
+
+    def test_directory_is_cached(self, router):
+        """Тест: повторный запрос не обращается к shard_directory"""
+        router.shard_for_user(7)
+        router.shard_for_user(7)
+        assert router.db.engine.queries == 1
+
+    def test_stale_cache_follows_forwarding(self, router):
+        """Тест: после переноса другим процессом кэш исправляется по метке"""
+        home = router.shard_for_user(7)
+        target = (router.shards.index(home) + 1) % 3
+        move(router, 7, target)
+        directory_queries = router.db.engine.queries
+
+        assert router.shard_for_user(7) == router.shards[target]
+        assert router.db.engine.queries == directory_queries
+
+    def test_chain_of_moves(self, router):
+        """Тест нескольких переносов подряд"""
+        home = router.shards.index(router.shard_for_user(7))
+        move(router, 7, (home + 1) % 3)
+        move(router, 7, (home + 2) % 3)
+        router.cache_directory(7, None)
+        assert router.shard_for_user(7) == router.shards[(home + 2) % 3]
+
+    def test_cache_is_bounded(self, router):
+        """Тест: кэш shard_directory вытесняет давно не использованных пользователей"""
+        router.cache_size = 10
+        for user_id in range(100):
+            router.shard_for_user(user_id)
+        assert len(router.directory_cache) == 10
+        assert list(router.directory_cache) == list(range(90, 100))
+
+
+class TestGroupUsers:
+    """Тесты для ShardRouter.group_users"""
+
+    def test_groups(self, router):
+        """Тест: каждый пользователь попадает ровно в одну группу своего шарда"""
+        groups = router.group_users(list(range(1, 501)))
+        assert sorted(user_id for user_ids in groups.values() for user_id in user_ids) == list(range(1, 501))
+        for key, user_ids in groups.items():
+            assert all(router.shards[router.hash_shard(user_id)] == key for user_id in user_ids)
+
+    def test_one_directory_query(self, router):
+        """Тест: холодный пакет читает shard_directory одним запросом"""
+        router.group_users(list(range(1, 501)))
+        assert router.db.engine.queries == 1
+        assert sum(engine.queries for engine in router.db.engines.values()) == 0
+
+    def test_stale_cache_follows_forwarding(self, router):
+        """Тест: перенесенный пользователь переходит в группу нового шарда"""
+        router.group_users(list(range(1, 101)))
+        home = router.shard_for_user(5)
+        target = (router.shards.index(home) + 1) % 3
+        move(router, 5, target)
+
+        groups = router.group_users(list(range(1, 101)))
+        assert 5 in groups[router.shards[target]]
+        assert 5 not in groups.get(home, [])
+        assert sorted(user_id for user_ids in groups.values() for user_id in user_ids) == list(range(1, 101))